@@ -1,7 +1,7 @@
 # api/routers/admin.py
 from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Body, Query
 from auth.deps import require_admin
-from ingestion.ingest import ingest_file
+from ingestion import jobs
 from core.utils import logger as event_logger
 from pathlib import Path
 import uuid, shutil, asyncio
@@ -10,9 +10,19 @@ import os
 # DB helpers
 import db.modules as modules_db
 import db.logs as logs_db
+import db.jobs as jobs_db
+from db import engine as db_engine
+from auth import password as password_hashing
 
-# qdrant service (delete_by_module may be sync or async)
-from core.services import qdrant_service
+# qdrant service
+from core.services import vector_store
+from core.services import semantic_cache
+from core.services import embedder
+from core.services import embed_cache
+from core.services import lexical_index
+from core.pipeline import rerank
+from core.services import ollama_service
+from core.services import single_flight
 
 # config settings
 from config.settings import settings
@@ -23,7 +33,8 @@ router = APIRouter(prefix="/api/admin", tags=["admin"])
 @router.post("/upload")
 async def upload(file: UploadFile = File(...), module: str = Form(...), lang: str = Form("ja"), admin = Depends(require_admin)):
     """
-    Upload a file and ingest it into the specified module.
+    Upload a file and queue its ingestion into the specified module.
+    Returns the job id right away.
     """
     docs_dir = Path("docs")
     module_dir = docs_dir / module
@@ -36,22 +47,9 @@ async def upload(file: UploadFile = File(...), module: str = Form(...), lang: st
     existing = await modules_db.get_module_by_name(module)
     if not existing:
         await modules_db.create_module(module)
-    # run ingestion (ingest_file should return metadata about upserted points)
-    try:
-        # try with lang param, fall back if ingest_file signature differs
-        try:
-            metadata = await ingest_file(module, saved_path, lang=lang)
-        except TypeError:
-            metadata = await ingest_file(module, saved_path)
-    except TypeError:
-        # fallback for synchronous ingest_file
-        try:
-            metadata = ingest_file(module, saved_path, lang=lang)
-        except TypeError:
-            metadata = ingest_file(module, saved_path)
-    # log action
-    await event_logger.log_action(admin["user_id"], "UPLOAD_INGEST", {"module": module, "file": str(saved_path), "meta": metadata})
-    return {"ok": True, "meta": metadata}
+    # queue ingestion; progress/result are available from /api/admin/jobs/{job_id}
+    job = await jobs.submit("upload", module, saved_path, lang, admin["user_id"])
+    return {"ok": True, "job_id": job["job_id"], "job": job}
 
 
 @router.get("/modules")
@@ -63,6 +61,33 @@ async def list_modules(admin = Depends(require_admin)):
     return {"modules": mods}
 
 
+def _payload_index_status() -> dict:
+    if settings.VECTOR_BACKEND != "qdrant":
+        return {"checked": False, "backend": settings.VECTOR_BACKEND}
+    from core.services import qdrant_collection
+    return qdrant_collection.payload_index_status()
+
+
+@router.get("/stats")
+async def stats(admin = Depends(require_admin)):
+    """
+    Return runtime counters of in-process caches and workers.
+    """
+    return {
+        "semantic_cache": semantic_cache.stats(),
+        "embedder": embedder.stats(),
+        "embed_cache": embed_cache.stats(),
+        "reranker": rerank.stats(),
+        "ollama": ollama_service.stats(),
+        "single_flight": single_flight.stats(),
+        "payload_indexes": _payload_index_status(),
+        "ingest_jobs": jobs.stats(),
+        "db_pool": db_engine.stats(),
+        "log_writer": event_logger.stats(),
+        "password_hashing": password_hashing.stats(),
+    }
+
+
 @router.get("/logs")
 async def recent_logs(admin = Depends(require_admin), limit: int = 100):
     """
@@ -90,7 +115,7 @@ async def recent_logs(admin = Depends(require_admin), limit: int = 100):
 async def delete_module(module_name: str, admin = Depends(require_admin)):
     """
     Delete a module:
-      1) delete vectors from Qdrant collection for module (delete_by_module)
+      1) delete vectors of the module from the vector store (delete_by_module) and its lexical index rows
       2) delete docs folder
       3) delete DB record
       4) log action
@@ -100,14 +125,21 @@ async def delete_module(module_name: str, admin = Depends(require_admin)):
     if not module:
         raise HTTPException(status_code=404, detail="Module not found")
 
-    # 1) delete vectors from Qdrant
+    # 1) delete vectors from the vector store, then the lexical index rows; both are attempted
+    #    so one store failing doesn't leave the other behind, and each failure is reported as itself
+    errors = []
     try:
-        res = qdrant_service.delete_by_module(settings.QDRANT_COLLECTION, module_name)
-        if asyncio.iscoroutine(res):
-            await res
+        await vector_store.adelete_by_module(settings.QDRANT_COLLECTION, module_name)
     except Exception as exc:
         await event_logger.log_action(admin["user_id"], "DELETE_MODULE_FAILED_QDRANT", {"module": module_name, "error": str(exc)})
-        raise HTTPException(status_code=500, detail=f"Failed to delete vectors: {exc}")
+        errors.append(f"Failed to delete vectors: {exc}")
+    try:
+        await lexical_index.delete_module(module_name)
+    except Exception as exc:
+        await event_logger.log_action(admin["user_id"], "DELETE_MODULE_FAILED_LEXICAL", {"module": module_name, "error": str(exc)})
+        errors.append(f"Failed to delete lexical index rows: {exc}")
+    if errors:
+        raise HTTPException(status_code=500, detail="; ".join(errors))
 
     # 2) delete docs folder
     p = Path("docs") / module_name
@@ -182,7 +214,7 @@ async def delete_module_file(module_name: str, name: str = Query(...), admin = D
 @router.post("/module/{module_name}/file/reingest")
 async def reingest_module_file(module_name: str, payload: dict = Body(...), admin = Depends(require_admin)):
     """
-    Re-ingest a saved file present in docs/<module>/<filename>.
+    Queue a re-ingest of a saved file present in docs/<module>/<filename>.
     Body: {"filename": "<name>", "lang": "ja"}  # lang optional
     """
     filename = payload.get("filename")
@@ -204,13 +236,35 @@ async def reingest_module_file(module_name: str, payload: dict = Body(...), admi
     # determine language: prefer provided lang, else keep 'ja' default
     use_lang = lang if lang else "ja"
 
-    try:
-        meta = await ingest_file(module_name, target, lang=use_lang)
-    except Exception as exc:
-        await event_logger.log_action(admin["user_id"], "REINGEST_FAILED", {"module": module_name, "file": filename, "error": str(exc)})
-        raise HTTPException(status_code=500, detail=f"Reingest failed: {exc}")
+    job = await jobs.submit("reingest", module_name, target, use_lang, admin["user_id"])
+    return {"ok": True, "job_id": job["job_id"], "job": job}
+
+
+@router.get("/jobs")
+async def list_jobs(admin = Depends(require_admin), limit: int = 100):
+    """
+    Return recent ingestion jobs (default limit 100).
+    """
+    return {"jobs": await jobs_db.list_jobs(limit)}
 
-    await event_logger.log_action(admin["user_id"], "REINGEST_FILE", {"module": module_name, "file": filename, "lang": use_lang})
-    return {"ok": True, "meta": meta}
 
-    return {"ok": True, "meta": meta}
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, admin = Depends(require_admin)):
+    """
+    Return status and progress (chunks embedded/upserted) of an ingestion job.
+    """
+    job = await jobs_db.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job": job}
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, admin = Depends(require_admin)):
+    """
+    Cancel a queued or running ingestion job.
+    """
+    job = await jobs.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"ok": job["status"] == "cancelled", "job": job}
@@ -45,7 +45,7 @@ async def login(req: LoginRequest, resp: Response, request: Request):
         httponly=True,
         secure=settings.SECURE_COOKIE,
         samesite="lax",
-        max_age=60*60*24     # 1 day TTL (seconds)
+        max_age=settings.SESSION_TTL     # server-side expiry slides; default 1 day (seconds)
     )
 
     # 3) Log success
@@ -66,13 +66,13 @@ async def logout(resp: Response, request: Request):
     if sid:
         # remove server-side session mapping
         try:
-            s = get_session(sid)
+            s = await get_session(sid)
             if s:
                 await event_logger.log_action(s.get("user_id"), "AUTH_LOGOUT", {"ip": request.client.host if request.client else None})
         except Exception:
             # continue even if logger fails
             pass
-        delete_session(sid)
+        await delete_session(sid)
 
     # delete cookie client-side
     resp.delete_cookie("session_id")
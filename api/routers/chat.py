@@ -1,13 +1,22 @@
 # api/routers/chat.py
+import asyncio
+import json
+import time
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from core.services.embedder import embed_text
-from core.pipeline.retrieve import run_retrieval
-from core.pipeline.prompt import build_prompt
-from core.services.ollama_service import generate
+from core.services.embedder import embed_text, embed_texts
+from core.pipeline.retrieve import run_retrieval, run_retrieval_batch
+from core.pipeline.prompt import assemble_prompt
+from core.services.ollama_service import generate, generate_stream, OllamaOverloaded
 from core.services.redis_service import get_cached_answer, set_cached_answer
-from auth.deps import require_user  # optional if you want to require auth for chat
-from typing import Optional
+from core.services.semantic_cache import get_similar_answer, set_similar_answer
+from core.services import single_flight
+from core.utils import metrics
+from core.utils.metrics import timed
+from auth.deps import require_user, require_admin  # optional if you want to require auth for chat
+from config.settings import settings
+from typing import List, Optional
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
@@ -16,33 +25,27 @@ class Query(BaseModel):
     lang: str = "ja"  # default
     module: Optional[str] = None  # optional module filter
 
-@router.post("/query")
-async def query(q: Query):
-    # 1 - check cache (cache key could incorporate lang/module for safety)
-    cache_key = f"{q.text}||lang:{q.lang}||module:{q.module or ''}"
-    cached = await get_cached_answer(cache_key)
-    if cached:
-        return {"answer": cached["answer"], "cached": True, "sources": cached.get("sources", [])}
 
-    # 2 - embed
-    vec = await embed_text(q.text)
+class BatchRequest(BaseModel):
+    queries: List[Query]
+    concurrency: Optional[int] = None  # parallel generations (default BATCH_CONCURRENCY, capped, see _batch_concurrency)
+    use_cache: bool = True  # False forces fresh answers (regression runs)
+
 
-    # 3 - retrieve (run_retrieval is sync but quick; it returns qdrant hits)
-    results = run_retrieval(vec, lang=q.lang, top_k=None, module=q.module)
+def _cache_key(q: Query) -> str:
+    # cache key incorporates lang/module for safety
+    return f"{q.text}||lang:{q.lang}||module:{q.module or ''}"
 
-    # 4 - build prompt (build_prompt should accept the raw results format)
-    prompt = build_prompt(q.text, results, q.lang)
 
-    # 5 - call model
-    resp = await generate(prompt)
-    # normalize model output (adjust based on your ollama_service output)
-    answer = None
+def _answer_text(resp) -> str:
+    # normalize model output (ollama /api/generate puts the completion in "response")
     if isinstance(resp, dict):
-        answer = resp.get("generated_text") or resp.get("text") or resp.get("answer") or str(resp)
-    else:
-        answer = str(resp)
+        return resp.get("response") or resp.get("generated_text") or resp.get("text") or resp.get("answer") or str(resp)
+    return str(resp)
+
 
-    # 6 - cache (serialize sources sensibly)
+def _serialize_sources(results) -> list:
+    # serialize sources sensibly
     try:
         sources = []
         for r in results:
@@ -56,7 +59,279 @@ async def query(q: Query):
             sources.append(payload)
     except Exception:
         sources = []
+    return sources
+
+
+def _count_cache(cache: str, hit) -> None:
+    metrics.CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def _sse(event: str, data) -> str:
+    # one Server-Sent Events frame; data is JSON so newlines in tokens stay escaped
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/query")
+async def query(q: Query):
+    # 1 - check cache
+    cache_key = _cache_key(q)
+    with timed("cache"):
+        cached = await get_cached_answer(cache_key)
+    _count_cache("exact", cached)
+    if cached:
+        return {"answer": cached["answer"], "cached": True, "sources": cached.get("sources", [])}
+
+    async def check_cache():
+        hit = await get_cached_answer(cache_key)
+        if hit:
+            return {"answer": hit["answer"], "cached": True, "sources": hit.get("sources", [])}
+        return None
+
+    # identical questions already being answered (here or on another worker) share that answer
+    return await single_flight.do(cache_key, lambda: _answer(q, cache_key), check_cache)
+
 
+async def _answer(q: Query, cache_key: str) -> dict:
+    # 2 - embed
+    with timed("embed"):
+        vec = await embed_text(q.text)
+
+    # 2b - semantic cache: reuse the answer of a near-identical earlier question
+    with timed("semantic_cache"):
+        similar = await get_similar_answer(vec, q.lang, q.module)
+    _count_cache("semantic", similar)
+    if similar:
+        hit, score = similar
+        return {"answer": hit["answer"], "cached": True, "similarity": score, "sources": hit.get("sources", [])}
+
+    # 3 - retrieve (returns qdrant hits)
+    with timed("retrieve"):
+        results = await run_retrieval(vec, lang=q.lang, top_k=None, module=q.module, query=q.text)
+
+    # 4 - build prompt within the token budget (merges adjacent chunks, drops repeated overlap)
+    with timed("prompt"):
+        prompt, prompt_stats = assemble_prompt(q.text, results, q.lang)
+    metrics.PROMPT_TOKENS.observe(prompt_stats["prompt_tokens"])
+
+    # 5 - call model (the scheduler rejects fast when Ollama is saturated)
+    try:
+        with timed("generate"):
+            resp = await generate(prompt)
+    except OllamaOverloaded as exc:
+        raise HTTPException(status_code=503, detail=f"Model busy: {exc}", headers={"Retry-After": "5"})
+    answer = _answer_text(resp)
+
+    # 6 - cache
+    sources = _serialize_sources(results)
     await set_cached_answer(cache_key, {"answer": answer, "sources": sources})
+    await set_similar_answer(vec, q.lang, q.module, {"answer": answer, "sources": sources})
+
+    return {"answer": answer, "cached": False, "sources": sources, "prompt_tokens": prompt_stats["prompt_tokens"]}
+
+
+@router.post("/stream")
+async def stream(q: Query):
+    """
+    Same pipeline as /query, but the answer is streamed as Server-Sent Events:
+      event: sources  -> {"sources": [...], "cached": bool}  (sent before generation starts)
+      event: token    -> {"text": "..."}                     (one per model fragment)
+      event: done     -> {"answer": "...", "cached": bool, "prompt_tokens": int (live answers only)}
+      event: error    -> {"detail": "..."}                   (any failure after the stream started; last frame)
+    The full answer is written to the cache once the model stream completes.
+    """
+    cache_key = _cache_key(q)
+    with timed("cache"):
+        cached = await get_cached_answer(cache_key)
+    _count_cache("exact", cached)
+
+    async def cached_events(hit):
+        yield _sse("sources", {"sources": hit.get("sources", []), "cached": True})
+        yield _sse("token", {"text": hit["answer"]})
+        yield _sse("done", {"answer": hit["answer"], "cached": True})
+
+    async def live_events():
+        # headers are already sent once the first frame is out, so every failure (embedding,
+        # retrieval, generation) ends the stream with an error event; a partial answer is not cached
+        step = "Embedding"
+        try:
+            with timed("embed"):
+                vec = await embed_text(q.text)
+            with timed("semantic_cache"):
+                similar = await get_similar_answer(vec, q.lang, q.module)
+            _count_cache("semantic", similar)
+            if similar:
+                async for frame in cached_events(similar[0]):
+                    yield frame
+                return
+            step = "Retrieval"
+            with timed("retrieve"):
+                results = await run_retrieval(vec, lang=q.lang, top_k=None, module=q.module, query=q.text)
+            sources = _serialize_sources(results)
+            yield _sse("sources", {"sources": sources, "cached": False})
+
+            step = "Prompt assembly"
+            with timed("prompt"):
+                prompt, prompt_stats = assemble_prompt(q.text, results, q.lang)
+            metrics.PROMPT_TOKENS.observe(prompt_stats["prompt_tokens"])
+            step = "Generation"
+            parts = []
+            with timed("generate"):
+                async for token in generate_stream(prompt):
+                    parts.append(token)
+                    yield _sse("token", {"text": token})
+
+            answer = "".join(parts)
+            try:
+                await set_cached_answer(cache_key, {"answer": answer, "sources": sources})
+                await set_similar_answer(vec, q.lang, q.module, {"answer": answer, "sources": sources})
+            except Exception as exc:
+                # the client already has the whole answer; only the cache write is lost
+                print("failed to cache streamed answer:", exc)
+            yield _sse("done", {"answer": answer, "cached": False, "prompt_tokens": prompt_stats["prompt_tokens"]})
+        except OllamaOverloaded as exc:
+            yield _sse("error", {"detail": f"Model busy: {exc}", "retry_after": 5})
+        except Exception as exc:
+            yield _sse("error", {"detail": f"{step} failed: {exc}"})
+
+    events = cached_events(cached) if cached else live_events()
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # stop proxies (nginx) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+
+def _ndjson(data) -> str:
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+
+async def _generate_patiently(prompt: str):
+    # batch work waits for the model instead of failing: back off while the scheduler is saturated
+    for attempt in range(settings.BATCH_OVERLOAD_RETRIES + 1):
+        try:
+            return await generate(prompt)
+        except OllamaOverloaded:
+            if attempt == settings.BATCH_OVERLOAD_RETRIES:
+                raise
+            await asyncio.sleep(min(2 ** attempt, 30))
+
+
+def _batch_concurrency(requested: Optional[int]) -> int:
+    # a batch never takes every generation slot, so interactive /query keeps getting admitted:
+    # default half of OLLAMA_MAX_INFLIGHT, at most OLLAMA_MAX_INFLIGHT - 1 (1 if there is only one slot)
+    cap = max(1, settings.OLLAMA_MAX_INFLIGHT - 1)
+    default = settings.BATCH_CONCURRENCY or max(1, settings.OLLAMA_MAX_INFLIGHT // 2)
+    return max(1, min(requested or default, cap))
+
+
+@router.post("/batch")
+async def batch(req: BatchRequest, admin = Depends(require_admin)):
+    """
+    Answer many questions in one request (QA regression runs, FAQ pre-generation).
+    Pipeline:
+      1) exact Redis cache for every question
+      2) one embed_texts call for all misses
+      3) semantic cache
+      4) one batched vector search (run_retrieval_batch)
+      5) generation with at most `concurrency` answers in flight
+    Stages 1, 2 and 4 cover the whole batch and are timed as batch_cache, batch_embed and
+    batch_retrieve, apart from the per-request stage series; prompt/generate are per question.
+    Results stream back as NDJSON, one line per question as soon as its answer is ready
+    (so not in input order):
+      {"index": i, "text": "...", "answer": "...", "cached": bool, "sources": [...], "prompt_tokens": int}
+      {"index": i, "text": "...", "error": "..."}
+    and a final {"done": true, "count", "cached", "errors", "elapsed_ms"} line.
+    """
+    if not req.queries:
+        raise HTTPException(status_code=400, detail="No queries")
+    if len(req.queries) > settings.BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BATCH_MAX_QUERIES} queries per batch")
+    concurrency = _batch_concurrency(req.concurrency)
+    queries = req.queries
+
+    async def answer_one(sem: asyncio.Semaphore, i: int, vec, results) -> dict:
+        q = queries[i]
+        async with sem:
+            try:
+                with timed("prompt"):
+                    prompt, prompt_stats = assemble_prompt(q.text, results, q.lang)
+                metrics.PROMPT_TOKENS.observe(prompt_stats["prompt_tokens"])
+                with timed("generate"):
+                    answer = _answer_text(await _generate_patiently(prompt))
+            except Exception as exc:
+                return {"index": i, "text": q.text, "error": f"Generation failed: {exc}"}
+        sources = _serialize_sources(results)
+        await set_cached_answer(_cache_key(q), {"answer": answer, "sources": sources})
+        await set_similar_answer(vec, q.lang, q.module, {"answer": answer, "sources": sources})
+        return {"index": i, "text": q.text, "answer": answer, "cached": False, "sources": sources,
+                "prompt_tokens": prompt_stats["prompt_tokens"]}
+
+    async def events():
+        started = time.perf_counter()
+        counts = {"count": len(queries), "cached": 0, "errors": 0}
+        tasks = []
+        try:
+            # 1 - exact cache
+            if req.use_cache:
+                with timed("batch_cache"):
+                    hits = await asyncio.gather(*[get_cached_answer(_cache_key(q)) for q in queries])
+            else:
+                hits = [None] * len(queries)
+            pending = []
+            for i, (q, hit) in enumerate(zip(queries, hits)):
+                if req.use_cache:
+                    _count_cache("exact", hit)
+                if hit:
+                    counts["cached"] += 1
+                    yield _ndjson({"index": i, "text": q.text, "answer": hit["answer"], "cached": True, "sources": hit.get("sources", [])})
+                else:
+                    pending.append(i)
+
+            if pending:
+                # 2 - embed all misses at once
+                with timed("batch_embed"):
+                    vectors = await embed_texts([queries[i].text for i in pending])
+
+                # 3 - semantic cache
+                todo = []
+                for i, vec in zip(pending, vectors):
+                    similar = await get_similar_answer(vec, queries[i].lang, queries[i].module) if req.use_cache else None
+                    if req.use_cache:
+                        _count_cache("semantic", similar)
+                    if similar:
+                        counts["cached"] += 1
+                        hit, score = similar
+                        yield _ndjson({"index": i, "text": queries[i].text, "answer": hit["answer"], "cached": True,
+                                       "similarity": score, "sources": hit.get("sources", [])})
+                    else:
+                        todo.append((i, vec))
+
+                # 4 - one batched search
+                with timed("batch_retrieve"):
+                    results = await run_retrieval_batch(
+                        [vec for _, vec in todo],
+                        [queries[i].text for i, _ in todo],
+                        [queries[i].lang for i, _ in todo],
+                        [queries[i].module for i, _ in todo],
+                    )
+
+                # 5 - bounded-concurrency generation, streamed in completion order
+                sem = asyncio.Semaphore(concurrency)
+                tasks = [asyncio.create_task(answer_one(sem, i, vec, res)) for (i, vec), res in zip(todo, results)]
+                for fut in asyncio.as_completed(tasks):
+                    line = await fut
+                    if "error" in line:
+                        counts["errors"] += 1
+                    yield _ndjson(line)
+        except Exception as exc:
+            # headers are already sent, so report the failure in-band
+            yield _ndjson({"error": f"Batch failed: {exc}"})
+        finally:
+            # client went away or the batch failed: don't leave generations running
+            for t in tasks:
+                t.cancel()
+        yield _ndjson({"done": True, **counts, "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 1)})
 
-    return {"answer": answer, "cached": False, "sources": sources}
+    return StreamingResponse(events(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
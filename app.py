@@ -1,9 +1,39 @@
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from config.settings import settings
-
-
-app = FastAPI(title="RAG Chatbot")
+from core.services import vector_store
+from db import engine as db_engine
+from ingestion import jobs
+from core.utils import logger as event_logger
+from ingestion.parse import pdf_parser
+from db.lexical import init_lexical_tables
+from core.utils import metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # startup: create the lexical index tables, ensure Qdrant payload indexes, start the audit-log writer,
+    # resume unfinished ingestion jobs and start the worker pool
+    await init_lexical_tables()
+    if settings.VECTOR_BACKEND == "qdrant":
+        # keyword indexes on module/lang/filename keep filtered search and delete-by-module fast
+        from core.services import qdrant_collection
+        await qdrant_collection.check_payload_indexes_at_startup()
+    await event_logger.start_log_writer()
+    await jobs.start()
+    yield
+    # shutdown: stop workers, flush pending log rows, then release pooled connections
+    await jobs.stop()
+    await event_logger.stop_log_writer()
+    pdf_parser.shutdown_pool()
+    await vector_store.aclose()
+    await db_engine.close_pool()
+
+
+app = FastAPI(title="RAG Chatbot", lifespan=lifespan)
 
 
 
@@ -18,6 +48,31 @@ app.include_router(chat_router)
 app.include_router(admin_router)
 
 
+# queue depths, pool usage and cache counters of the in-process components; fields that only
+# grow are exported as counters (<field>_total), the rest as gauges
+from core.services import embedder, embed_cache, semantic_cache, ollama_service, single_flight
+from core.pipeline import rerank
+from auth import password as password_hashing
+
+metrics.register_stats("ollama", ollama_service.stats,
+                       counters=("admitted", "rejected", "queue_timeouts", "failed"))
+metrics.register_stats("embedder", embedder.stats, counters=("batches", "items", "errors"))
+metrics.register_stats("embed_cache", embed_cache.stats, counters=("hits", "misses", "evictions"))
+metrics.register_stats("semantic_cache", semantic_cache.stats,
+                       counters=("hits", "misses", "evictions", "expirations"))
+metrics.register_stats("reranker", rerank.stats,
+                       counters=("passes", "pairs_scored", "cache_hits", "cache_misses", "timeouts", "cancelled", "skipped"))
+metrics.register_stats("single_flight", single_flight.stats,
+                       counters=("leaders", "followers", "remote_waits", "remote_hits", "remote_fallbacks"))
+metrics.register_stats("ingest_jobs", jobs.stats)
+metrics.register_stats("db_pool", db_engine.stats, counters=("read_acquires", "write_acquires"))
+metrics.register_stats("log_writer", event_logger.stats)
+metrics.register_stats("password_hashing", password_hashing.stats, counters=("calls",))
+if settings.VECTOR_BACKEND == "local":
+    from core.services import local_vector_store
+    metrics.register_stats("local_vectors", local_vector_store.stats)
+
+
 
 
 
@@ -26,6 +81,13 @@ def health():
     return {"ok": True}
 
 
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics():
+        # Prometheus text exposition format 0.0.4
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 
 #Serves Single Page Application from ./public (index.html served at /)
 app.mount("/",StaticFiles(directory="public", html=True), name="public")
@@ -38,4 +100,22 @@ async def disable_html_caching(request: Request, call_next):
     if content_type.startswith("text/html"):
         resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
         resp.headers["Pragma"] = "no-cache"
-    return resp
\ No newline at end of file
+    return resp
+
+
+@app.middleware("http")
+async def stage_timing(request: Request, call_next):
+    # collect per-stage timings of this request; for streamed responses only the stages
+    # finished before the headers went out are included
+    metrics.start_request()
+    started = time.perf_counter()
+    resp = await call_next(request)
+    elapsed = time.perf_counter() - started
+    route = request.scope.get("route")
+    metrics.HTTP_SECONDS.observe(elapsed, path=getattr(route, "path", "static"), method=request.method,
+                                 status=str(resp.status_code))
+    if settings.SERVER_TIMING_ENABLED:
+        header = metrics.server_timing_header(total_ms=elapsed * 1000.0)
+        if header:
+            resp.headers["Server-Timing"] = header
+    return resp
@@ -2,21 +2,25 @@
 from typing import Dict, Optional
 from fastapi import Request, HTTPException, Depends
 from db.users import get_user_by_id
-from auth.sessions import get_session
+from auth.sessions import get_session, get_cached_user, cache_user
 
 async def require_user(request: Request) -> Dict:
     """
     Validate session cookie -> server session -> database user.
     Raises 401 if not authenticated.
     Returns the user dict from db.users.get_user_by_id.
+    Recently validated sessions are served from the in-process cache (no Redis/DB hit).
     """
     sid = request.cookies.get("session_id")
     if not sid:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    # get_session currently synchronous (in-memory). If you move sessions to Redis,
-    # change this call to await get_session(sid) and update implementation.
-    s = get_session(sid)
+    user = get_cached_user(sid)
+    if user:
+        return user
+
+    # sessions live in Redis; reading one also slides its expiry
+    s = await get_session(sid)
     if not s:
         raise HTTPException(status_code=401, detail="Invalid session")
 
@@ -24,6 +28,7 @@ async def require_user(request: Request) -> Dict:
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
 
+    cache_user(sid, user)
     return user
 
 async def require_admin(user: Dict = Depends(require_user)) -> Dict:
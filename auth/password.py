@@ -1,12 +1,73 @@
 # auth/password.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
+from config.settings import settings
 
-pwd_ctx = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
+pwd_ctx = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__rounds=settings.ARGON2_TIME_COST,
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2__parallelism=settings.ARGON2_PARALLELISM,
+)
+
+# Dedicated pool for hashing: argon2/bcrypt release the GIL, so threads run in parallel,
+# and the worker count caps how many hashes run at once (extra calls queue up).
+_executor = ThreadPoolExecutor(max_workers=max(1, settings.PASSWORD_HASH_WORKERS), thread_name_prefix="pwhash")
+
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "queued": 0, "running": 0, "queue_wait_total": 0.0, "queue_wait_max": 0.0, "hash_time_total": 0.0}
 
 def hash_password(plain: str) -> str:
-    """Return bcrypt hash of plain password."""
+    """Return argon2 hash of plain password."""
     return pwd_ctx.hash(plain)
 
 def verify_password(plain: str, hashed: str) -> bool:
     """Return True if plain matches hashed password."""
     return pwd_ctx.verify(plain, hashed)
+
+async def _run_in_pool(fn, *args):
+    submitted = time.perf_counter()
+    with _stats_lock:
+        _stats["queued"] += 1
+
+    def timed():
+        started = time.perf_counter()
+        waited = started - submitted
+        with _stats_lock:
+            _stats["queued"] -= 1
+            _stats["running"] += 1
+            _stats["queue_wait_total"] += waited
+            _stats["queue_wait_max"] = max(_stats["queue_wait_max"], waited)
+        try:
+            return fn(*args)
+        finally:
+            with _stats_lock:
+                _stats["running"] -= 1
+                _stats["hash_time_total"] += time.perf_counter() - started
+                _stats["calls"] += 1
+
+    return await asyncio.get_running_loop().run_in_executor(_executor, timed)
+
+async def hash_password_async(plain: str) -> str:
+    """hash_password on the hashing pool, without blocking the event loop."""
+    return await _run_in_pool(hash_password, plain)
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    """verify_password on the hashing pool, without blocking the event loop."""
+    return await _run_in_pool(verify_password, plain, hashed)
+
+def stats() -> dict:
+    calls = _stats["calls"]
+    return {
+        "workers": _executor._max_workers,
+        "queued": _stats["queued"],
+        "running": _stats["running"],
+        "calls": calls,
+        "avg_queue_wait_ms": (_stats["queue_wait_total"] / calls * 1000.0) if calls else 0.0,
+        "max_queue_wait_ms": _stats["queue_wait_max"] * 1000.0,
+        "avg_hash_ms": (_stats["hash_time_total"] / calls * 1000.0) if calls else 0.0,
+    }
@@ -1,17 +1,91 @@
 # auth/sessions.py
+import json
 import secrets
+import time
+from collections import OrderedDict
 from typing import Optional
 
-# In-memory sessions for dev. Replace with Redis in prod.
-_sessions: dict = {}
+from core.services.redis_service import redis_client
+from config.settings import settings
+
+# Sessions live in Redis so every worker/host sees them:
+#   session:<sid>             -> {"user_id": ...}, expires after SESSION_TTL of inactivity
+#   user_sessions:<user_id>   -> set of that user's sids (to revoke them all)
+SESSION_PREFIX = "session:"
+USER_SESSIONS_PREFIX = "user_sessions:"
+
+# Short-lived in-process cache of sid -> user row, so authenticated requests skip
+# Redis and SQLite. Entries expire after SESSION_CACHE_TTL seconds; other workers
+# may therefore keep a revoked session for at most that long.
+_user_cache: "OrderedDict[str, tuple]" = OrderedDict()
 
 async def create_session(user_id: str) -> str:
     sid = secrets.token_urlsafe(32)
-    _sessions[sid] = {"user_id": user_id}
+    pipe = redis_client.pipeline()
+    pipe.set(SESSION_PREFIX + sid, json.dumps({"user_id": user_id}), ex=settings.SESSION_TTL)
+    pipe.sadd(USER_SESSIONS_PREFIX + user_id, sid)
+    pipe.expire(USER_SESSIONS_PREFIX + user_id, settings.SESSION_TTL)
+    await pipe.execute()
     return sid
 
-def get_session(sid: str) -> Optional[dict]:
-    return _sessions.get(sid)
+async def get_session(sid: str) -> Optional[dict]:
+    """
+    Return the session and slide its expiry, or None if unknown/expired.
+    The user's session index slides with it, so delete_user_sessions() still finds
+    sessions that have been in use for longer than one SESSION_TTL.
+    """
+    data = await redis_client.getex(SESSION_PREFIX + sid, ex=settings.SESSION_TTL)
+    if not data:
+        return None
+    session = json.loads(data)
+    # re-adding the sid restores an index that already expired; every member expires
+    # within SESSION_TTL from now, so the new expiry never cuts one short
+    key = USER_SESSIONS_PREFIX + session["user_id"]
+    pipe = redis_client.pipeline()
+    pipe.sadd(key, sid)
+    pipe.expire(key, settings.SESSION_TTL)
+    await pipe.execute()
+    return session
+
+async def delete_session(sid: str):
+    invalidate_cached_user(sid)
+    data = await redis_client.getdel(SESSION_PREFIX + sid)
+    if data:
+        await redis_client.srem(USER_SESSIONS_PREFIX + json.loads(data)["user_id"], sid)
+
+async def delete_user_sessions(user_id: str):
+    """
+    Revoke every session of a user (e.g. after a password change).
+    """
+    key = USER_SESSIONS_PREFIX + user_id
+    sids = await redis_client.smembers(key)
+    if sids:
+        await redis_client.delete(*[SESSION_PREFIX + sid for sid in sids])
+    await redis_client.delete(key)
+    invalidate_cached_user_id(user_id)
+
+# -----------------------
+# in-process session -> user cache
+# -----------------------
+def get_cached_user(sid: str) -> Optional[dict]:
+    entry = _user_cache.get(sid)
+    if entry is None:
+        return None
+    expires_at, user = entry
+    if expires_at <= time.monotonic():
+        _user_cache.pop(sid, None)
+        return None
+    return user
+
+def cache_user(sid: str, user: dict):
+    _user_cache[sid] = (time.monotonic() + settings.SESSION_CACHE_TTL, user)
+    _user_cache.move_to_end(sid)
+    while len(_user_cache) > settings.SESSION_CACHE_MAX:
+        _user_cache.popitem(last=False)
+
+def invalidate_cached_user(sid: str):
+    _user_cache.pop(sid, None)
 
-def delete_session(sid: str):
-    _sessions.pop(sid, None)
+def invalidate_cached_user_id(user_id: str):
+    for sid in [sid for sid, (_, user) in _user_cache.items() if user.get("user_id") == user_id]:
+        _user_cache.pop(sid, None)
@@ -3,13 +3,123 @@ import os
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
+    # vector store backend: "qdrant" (server) or "local" (in-process index under LOCAL_VECTOR_DIR)
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "qdrant").lower()
+    LOCAL_VECTOR_DIR: str = os.getenv("LOCAL_VECTOR_DIR", "data/vectors")
+    LOCAL_VECTOR_DTYPE: str = os.getenv("LOCAL_VECTOR_DTYPE", "float16")
     QDRANT_URL: str = os.getenv("QDRANT_URL", "http://127.0.0.1:6333")
     QDRANT_COLLECTION: str = os.getenv("QDRANT_COLLECTION", "kb_chunks")
+    QDRANT_POOL_SIZE: int = int(os.getenv("QDRANT_POOL_SIZE", 20))
+    QDRANT_TIMEOUT: int = int(os.getenv("QDRANT_TIMEOUT", 10))
+    # collection layout (scripts/init_db.py --collection): originals on disk, int8 copy in RAM, HNSW graph params
+    QDRANT_VECTORS_ON_DISK: bool = os.getenv("QDRANT_VECTORS_ON_DISK", "true").lower() == "true"
+    QDRANT_QUANTIZATION: str = os.getenv("QDRANT_QUANTIZATION", "int8").lower()  # "int8" or "none"
+    QDRANT_QUANTIZATION_QUANTILE: float = float(os.getenv("QDRANT_QUANTIZATION_QUANTILE", 0.99))
+    QDRANT_HNSW_M: int = int(os.getenv("QDRANT_HNSW_M", 16))
+    QDRANT_HNSW_EF_CONSTRUCT: int = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", 128))
+    # query time: HNSW beam width; fetch limit*oversampling quantized candidates, rescore with originals
+    QDRANT_HNSW_EF: int = int(os.getenv("QDRANT_HNSW_EF", 64))
+    QDRANT_OVERSAMPLING: float = float(os.getenv("QDRANT_OVERSAMPLING", 2.0))
+    QDRANT_RESCORE: bool = os.getenv("QDRANT_RESCORE", "true").lower() == "true"
     OLLAMA_URL: str = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")
     LLM_MODEL: str = os.getenv("LLM_MODEL", "gemma3:4B")
+    OLLAMA_TIMEOUT: float = float(os.getenv("OLLAMA_TIMEOUT", 300))
+    # generation scheduler: in-flight cap (match OLLAMA_NUM_PARALLEL), bounded wait queue, fast 503 beyond it
+    OLLAMA_MAX_INFLIGHT: int = int(os.getenv("OLLAMA_MAX_INFLIGHT", 2))
+    OLLAMA_MAX_QUEUE: int = int(os.getenv("OLLAMA_MAX_QUEUE", 16))
+    OLLAMA_QUEUE_TIMEOUT: float = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", 30))
+    OLLAMA_KEEP_ALIVE: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    OLLAMA_NUM_CTX: int = int(os.getenv("OLLAMA_NUM_CTX", 4096))
+    OLLAMA_NUM_PREDICT: int = int(os.getenv("OLLAMA_NUM_PREDICT", 512))
     EMBED_MODEL: str = os.getenv("EMBED_MODEL", "intfloat/multilingual-e5-small")
+    EMBED_DIM: int = int(os.getenv("EMBED_DIM", 0))  # 0 = ask the loaded model
     TOP_K: int = int(os.getenv("TOP_K", 6))
     SECURE_COOKIE: bool = False
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 4))
+
+    # password hashing (argon2 cost parameters and the dedicated hashing pool)
+    ARGON2_TIME_COST: int = int(os.getenv("ARGON2_TIME_COST", 3))
+    ARGON2_MEMORY_COST: int = int(os.getenv("ARGON2_MEMORY_COST", 65536))  # KiB
+    ARGON2_PARALLELISM: int = int(os.getenv("ARGON2_PARALLELISM", 4))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+
+    # sessions (Redis, sliding expiry) and the in-process session -> user cache
+    SESSION_TTL: int = int(os.getenv("SESSION_TTL", 60 * 60 * 24))
+    SESSION_CACHE_TTL: float = float(os.getenv("SESSION_CACHE_TTL", 30))
+    SESSION_CACHE_MAX: int = int(os.getenv("SESSION_CACHE_MAX", 10000))
+
+    # batched audit-log writer
+    LOG_BATCH_SIZE: int = int(os.getenv("LOG_BATCH_SIZE", 100))
+    LOG_FLUSH_INTERVAL_MS: int = int(os.getenv("LOG_FLUSH_INTERVAL_MS", 500))
+    LOG_QUEUE_MAX: int = int(os.getenv("LOG_QUEUE_MAX", 10000))
+
+    # embedding micro-batcher for concurrent embed_text calls
+    EMBED_BATCH_MAX_SIZE: int = int(os.getenv("EMBED_BATCH_MAX_SIZE", 32))
+    EMBED_BATCH_MAX_WAIT_MS: float = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", 5))
+    EMBED_QUEUE_MAX: int = int(os.getenv("EMBED_QUEUE_MAX", 1024))
+
+    # persistent embedding cache used during ingestion
+    EMBED_CACHE_ENABLED: bool = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+    EMBED_CACHE_DIR: str = os.getenv("EMBED_CACHE_DIR", "data/embed_cache")
+    EMBED_CACHE_MAX_ENTRIES: int = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", 200000))
+
+    # streaming ingestion pipeline
+    INGEST_EMBED_BATCH: int = int(os.getenv("INGEST_EMBED_BATCH", 64))
+    INGEST_UPSERT_BATCH: int = int(os.getenv("INGEST_UPSERT_BATCH", 256))
+    INGEST_QUEUE_DEPTH: int = int(os.getenv("INGEST_QUEUE_DEPTH", 4))
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", 1))
+    # running jobs send a heartbeat every INGEST_JOB_HEARTBEAT seconds; a job without one for
+    # INGEST_JOB_STALE_AFTER seconds belonged to a dead process and is queued again
+    INGEST_JOB_HEARTBEAT: int = int(os.getenv("INGEST_JOB_HEARTBEAT", 15))
+    INGEST_JOB_STALE_AFTER: int = int(os.getenv("INGEST_JOB_STALE_AFTER", 120))
+    # parallel PDF text extraction (process pool); 1 disables the pool
+    PDF_WORKERS: int = int(os.getenv("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+    PDF_PAGES_PER_SHARD: int = int(os.getenv("PDF_PAGES_PER_SHARD", 16))
+
+    # semantic answer cache keyed on query embeddings; SHARED keeps the entries in Redis for all workers
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.92))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 2000))
+    SEMANTIC_CACHE_TTL: int = int(os.getenv("SEMANTIC_CACHE_TTL", 86400))
+    SEMANTIC_CACHE_SHARED: bool = os.getenv("SEMANTIC_CACHE_SHARED", "true").lower() == "true"
+
+    # single-flight coalescing of identical uncached questions (in-process + Redis lock across workers;
+    # the lock is extended while its holder runs, so the TTL only bounds how long a crashed holder blocks)
+    SINGLE_FLIGHT_ENABLED: bool = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+    SINGLE_FLIGHT_LOCK_TTL_MS: int = int(os.getenv("SINGLE_FLIGHT_LOCK_TTL_MS", 30000))
+    SINGLE_FLIGHT_POLL_MS: int = int(os.getenv("SINGLE_FLIGHT_POLL_MS", 100))
+
+    # /api/chat/batch: max questions per request, parallel generations (0 = half of OLLAMA_MAX_INFLIGHT;
+    # always capped below OLLAMA_MAX_INFLIGHT so interactive queries keep a slot),
+    # retries with backoff while the generation scheduler rejects
+    BATCH_MAX_QUERIES: int = int(os.getenv("BATCH_MAX_QUERIES", 1000))
+    BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", 0))
+    BATCH_OVERLOAD_RETRIES: int = int(os.getenv("BATCH_OVERLOAD_RETRIES", 5))
+
+    # hybrid retrieval: dense + BM25 (SQLite FTS5) candidates fused with reciprocal rank fusion
+    HYBRID_ENABLED: bool = os.getenv("HYBRID_ENABLED", "true").lower() == "true"
+    HYBRID_CANDIDATES: int = int(os.getenv("HYBRID_CANDIDATES", 20))
+    RRF_K: int = int(os.getenv("RRF_K", 60))
+
+    # cross-encoder rerank: score RERANK_CANDIDATES hits, keep RERANK_TOP_K
+    RERANK_ENABLED: bool = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", 20))
+    RERANK_TOP_K: int = int(os.getenv("RERANK_TOP_K", 3))
+    RERANK_BUDGET_MS: float = float(os.getenv("RERANK_BUDGET_MS", 400))
+    # passes allowed to wait for the rerank thread; beyond that, requests skip reranking
+    RERANK_MAX_QUEUED: int = int(os.getenv("RERANK_MAX_QUEUED", 1))
+    RERANK_CACHE_MAX: int = int(os.getenv("RERANK_CACHE_MAX", 20000))
+
+    # prompt assembly: total token budget (keep below the model's num_ctx minus the answer length)
+    PROMPT_TOKEN_BUDGET: int = int(os.getenv("PROMPT_TOKEN_BUDGET", 3072))
+    PROMPT_MIN_PASSAGE_TOKENS: int = int(os.getenv("PROMPT_MIN_PASSAGE_TOKENS", 64))
+    # optional Hugging Face tokenizer name for exact counts; empty = estimate
+    PROMPT_TOKENIZER: str = os.getenv("PROMPT_TOKENIZER", "")
+
+    # metrics: Prometheus text at GET /metrics and a per-request Server-Timing header
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    SERVER_TIMING_ENABLED: bool = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
 
     class Config:
         env_file = ".env"
@@ -1,7 +1,171 @@
 # core/pipeline/prompt.py
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+try:
+    from transformers import AutoTokenizer
+except Exception:
+    AutoTokenizer = None
+
+from config.settings import settings
+
+# optional exact tokenizer (PROMPT_TOKENIZER, a Hugging Face tokenizer name); otherwise estimate
+_tokenizer = None
+if AutoTokenizer and settings.PROMPT_TOKENIZER:
+    try:
+        _tokenizer = AutoTokenizer.from_pretrained(settings.PROMPT_TOKENIZER)
+    except Exception:
+        _tokenizer = None
+
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff66-\uff9f]")
+_WORD_RE = re.compile(r"[^\W_]+|[^\w\s]", re.UNICODE)
+
+def count_tokens(text: str) -> int:
+    """
+    Token count of `text`: exact with PROMPT_TOKENIZER, otherwise a conservative estimate
+    (one token per CJK character or punctuation mark, ~4 characters per token for other words).
+    """
+    if not text:
+        return 0
+    if _tokenizer is not None:
+        return len(_tokenizer.encode(text, add_special_tokens=False))
+    cjk = len(_CJK_RE.findall(text))
+    rest = _CJK_RE.sub(" ", text)
+    return cjk + sum(max(1, math.ceil(len(w) / 4)) for w in _WORD_RE.findall(rest))
+
+def _chunk_payload(c) -> dict:
+    # hits may be dicts or qdrant ScoredPoint objects with .payload
+    payload = c.get("payload") if isinstance(c, dict) else getattr(c, "payload", None)
+    return payload or {}
+
+def _overlap(left: List[str], right: List[str]) -> int:
+    # longest suffix of `left` that is also a prefix of `right`
+    for n in range(min(len(left), len(right)), 0, -1):
+        if left[-n:] == right[:n]:
+            return n
+    return 0
+
+def merge_chunks(chunks: list) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Turn ranked hits into context passages:
+    - duplicate hits (same file and chunk_index, or same text) are dropped
+    - hits of the same file with consecutive chunk_index are joined into one passage,
+      without the words the chunker repeats between neighbours (ingest overlap)
+    Passages keep the rank of their best hit. Returns (passages, counters).
+    """
+    groups: Dict[tuple, List[tuple]] = {}
+    order: List[tuple] = []
+    seen = set()
+    unique = 0
+    for rank, c in enumerate(chunks):
+        payload = _chunk_payload(c)
+        text = payload.get("text", "")
+        index = payload.get("chunk_index")
+        filename = payload.get("filename")
+        key = (payload.get("module"), filename, index) if filename is not None and index is not None else text
+        if not text or key in seen or text in seen:
+            continue
+        seen.update((key, text))
+        unique += 1
+        group = (payload.get("module"), filename) if filename is not None and index is not None else ("", rank)
+        if group not in groups:
+            groups[group] = []
+            order.append(group)
+        groups[group].append((index if index is not None else 0, rank, text))
+
+    passages: List[Tuple[int, str]] = []
+    removed = 0
+    for group in order:
+        run_words: List[str] = []
+        run_rank = None
+        prev_index = None
+        for index, rank, text in sorted(groups[group]):
+            words = text.split()
+            if run_words and index == prev_index + 1:
+                n = _overlap(run_words, words)
+                removed += n
+                run_words.extend(words[n:])
+                run_rank = min(run_rank, rank)
+            else:
+                if run_words:
+                    passages.append((run_rank, " ".join(run_words)))
+                run_words, run_rank = list(words), rank
+            prev_index = index
+        if run_words:
+            passages.append((run_rank, " ".join(run_words)))
+    passages.sort(key=lambda p: p[0])
+    return [p[1] for p in passages], {"chunks_in": len(chunks), "chunks_unique": unique, "overlap_words_removed": removed}
+
+def _longest_fitting(n: int, fits) -> int:
+    # largest k in 0..n with fits(k) (binary search; fits is monotonic)
+    lo, hi = 0, n
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if fits(mid):
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _truncate_to_tokens(text: str, budget: int) -> str:
+    """
+    Longest prefix of `text` that fits in `budget` tokens, cut at a word boundary.
+    Text without spaces (Japanese, Chinese) is one "word", so when not even the first
+    word fits, it is cut at a character instead.
+    """
+    words = text.split()
+    n = _longest_fitting(len(words), lambda k: count_tokens(" ".join(words[:k])) <= budget)
+    if n:
+        return " ".join(words[:n])
+    text = text.strip()
+    return text[:_longest_fitting(len(text), lambda k: count_tokens(text[:k]) <= budget)]
+
+def assemble_prompt(question: str, chunks: list, lang: str = "ja", token_budget: Optional[int] = None) -> Tuple[str, dict]:
+    """
+    Build the prompt within `token_budget` (default PROMPT_TOKEN_BUDGET) tokens.
+    Context passages (see merge_chunks) are added best first until the budget is used up;
+    the first passage that does not fit is cut (at a word boundary where there is one) if at least
+    PROMPT_MIN_PASSAGE_TOKENS still fit, otherwise it and the rest are dropped.
+    Returns (prompt, stats) where stats has prompt_tokens, context_tokens, passages,
+    chunks_in, chunks_unique, overlap_words_removed and truncated.
+    """
+    budget = token_budget or settings.PROMPT_TOKEN_BUDGET
+    separator = "\n\n---\n"
+    instruction = f"You are a helpful support assistant. Answer concisely in {lang}."
+
+    def render(context: str) -> str:
+        return f"{instruction}\n\nContext:\n{context}\n\nUser question:\n{question}\n\nAnswer:"
+
+    passages, counters = merge_chunks(chunks)
+    remaining = budget - count_tokens(render(""))
+    used: List[str] = []
+    truncated = False
+    for passage in passages:
+        cost = count_tokens(passage) + (count_tokens(separator) if used else 0)
+        if cost <= remaining:
+            used.append(passage)
+            remaining -= cost
+            continue
+        truncated = True
+        room = remaining - (count_tokens(separator) if used else 0)
+        if room >= settings.PROMPT_MIN_PASSAGE_TOKENS:
+            cut = _truncate_to_tokens(passage, room)
+            if cut:
+                used.append(cut)
+        break
+
+    context = separator.join(used)
+    prompt = render(context)
+    stats = {
+        "prompt_tokens": count_tokens(prompt),
+        "context_tokens": count_tokens(context),
+        "passages": len(used),
+        "truncated": truncated,
+        **counters,
+    }
+    return prompt, stats
+
 def build_prompt(question: str, chunks: list, lang: str = "ja"):
     # chunks: list of {"payload": {"text": "...", ...}, "score": 0.9}
-    context = "\n\n---\n".join(c["payload"].get("text","") for c in chunks)
-    instruction = f"You are a helpful support assistant. Answer concisely in {lang}."
-    prompt = f"{instruction}\n\nContext:\n{context}\n\nUser question:\n{question}\n\nAnswer:"
+    prompt, _ = assemble_prompt(question, chunks, lang)
     return prompt
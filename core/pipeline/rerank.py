@@ -0,0 +1,164 @@
+# core/pipeline/rerank.py
+"""
+Cross-encoder reranking of retrieval candidates.
+
+run_retrieval fetches a wider candidate set (RERANK_CANDIDATES); rerank() scores
+every (query, chunk) pair in one batched CPU pass and keeps the best RERANK_TOP_K.
+- pair scores are cached (LRU, RERANK_CACHE_MAX) so repeated questions skip the model
+- passes run one at a time on a dedicated thread
+- if a pass exceeds RERANK_BUDGET_MS the candidates are returned in retrieval order
+  (a pass that already started finishes in the background and warms the cache; one
+  still waiting for the thread is cancelled)
+- when RERANK_MAX_QUEUED passes are already waiting for the thread, reranking is
+  skipped, so the backlog stays bounded under sustained load
+- batch callers (rerank(..., batch=True), one pass at a time) wait without budget or
+  queue limit, so interactive passes wait behind at most one of theirs
+Without sentence-transformers or a loadable model, rerank() only truncates.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+try:
+    from sentence_transformers import CrossEncoder
+except Exception:
+    CrossEncoder = None
+
+from config.settings import settings
+
+_model: Optional["CrossEncoder"] = None
+if CrossEncoder and settings.RERANK_ENABLED:
+    try:
+        _model = CrossEncoder(settings.RERANK_MODEL, device="cpu")
+    except Exception:
+        _model = None
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+
+_cache_lock = threading.Lock()
+_score_cache: "OrderedDict[str, float]" = OrderedDict()
+_stats = {"passes": 0, "pairs_scored": 0, "cache_hits": 0, "cache_misses": 0, "timeouts": 0, "cancelled": 0,
+          "skipped": 0, "score_time_total": 0.0}
+# passes submitted to the rerank thread that have not started yet (guarded by _cache_lock)
+_queued = 0
+
+
+def available() -> bool:
+    return settings.RERANK_ENABLED and _model is not None
+
+
+def _pair_key(query: str, text: str) -> str:
+    return hashlib.sha256(f"{query}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def _cached_scores(keys: List[str]) -> Dict[str, float]:
+    with _cache_lock:
+        found = {}
+        for key in keys:
+            score = _score_cache.get(key)
+            if score is not None:
+                _score_cache.move_to_end(key)
+                found[key] = score
+        return found
+
+
+def _score_pairs(query: str, items: Dict[str, str], counted: bool = True) -> Dict[str, float]:
+    # runs on the rerank thread: one batched predict over all uncached pairs
+    global _queued
+    with _cache_lock:
+        if counted:
+            _queued -= 1
+    started = time.perf_counter()
+    keys = list(items)
+    scores = _model.predict([(query, items[k]) for k in keys], batch_size=max(1, len(keys)), show_progress_bar=False)
+    result = {k: float(s) for k, s in zip(keys, scores)}
+    with _cache_lock:
+        for key, score in result.items():
+            _score_cache[key] = score
+            _score_cache.move_to_end(key)
+        while len(_score_cache) > settings.RERANK_CACHE_MAX:
+            _score_cache.popitem(last=False)
+        _stats["passes"] += 1
+        _stats["pairs_scored"] += len(keys)
+        _stats["score_time_total"] += time.perf_counter() - started
+    return result
+
+
+def _drop_if_waiting(cf, counted: bool = True) -> bool:
+    # a pass that has not started is cancelled instead of scoring pairs nobody waits for
+    global _queued
+    with _cache_lock:
+        if cf.cancel():
+            if counted:
+                _queued -= 1
+            _stats["cancelled"] += 1
+            return True
+    return False
+
+
+async def rerank(query: str, hits: List[dict], top_k: int, batch: bool = False) -> List[dict]:
+    """
+    Reorder hits ({"id", "payload", "score"}) by cross-encoder relevance to `query`
+    and return the best top_k, with "score" replaced by the cross-encoder score
+    (the retrieval score is kept as "retrieval_score").
+    batch=True waits for the pass however long it takes and bypasses RERANK_MAX_QUEUED;
+    batch callers must not run more than one such pass at a time.
+    """
+    global _queued
+    if not hits or not available():
+        return hits[:top_k]
+    texts = [(h.get("payload") or {}).get("text", "") for h in hits]
+    keys = [_pair_key(query, t) for t in texts]
+    scores = _cached_scores(keys)
+    missing = {k: t for k, t in zip(keys, texts) if k not in scores}
+    with _cache_lock:
+        _stats["cache_hits"] += len(keys) - len(missing)
+        _stats["cache_misses"] += len(missing)
+    if missing and batch:
+        cf = _executor.submit(_score_pairs, query, missing, False)
+        try:
+            scores.update(await asyncio.wrap_future(cf))
+        except asyncio.CancelledError:
+            _drop_if_waiting(cf, counted=False)
+            raise
+    elif missing:
+        with _cache_lock:
+            if _queued >= max(1, settings.RERANK_MAX_QUEUED):
+                _stats["skipped"] += 1
+                return hits[:top_k]
+            _queued += 1
+        cf = _executor.submit(_score_pairs, query, missing)
+        try:
+            scores.update(await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(cf)), settings.RERANK_BUDGET_MS / 1000.0))
+        except asyncio.TimeoutError:
+            with _cache_lock:
+                _stats["timeouts"] += 1
+            _drop_if_waiting(cf)
+            return hits[:top_k]
+        except asyncio.CancelledError:
+            _drop_if_waiting(cf)
+            raise
+    ranked = sorted(zip(hits, keys), key=lambda hk: scores[hk[1]], reverse=True)[:top_k]
+    return [{**h, "retrieval_score": h.get("score"), "score": scores[k]} for h, k in ranked]
+
+
+def stats() -> dict:
+    with _cache_lock:
+        passes = _stats["passes"]
+        return {
+            "enabled": settings.RERANK_ENABLED,
+            "model_loaded": _model is not None,
+            "cache_entries": len(_score_cache),
+            "passes": passes,
+            "pairs_scored": _stats["pairs_scored"],
+            "cache_hits": _stats["cache_hits"],
+            "cache_misses": _stats["cache_misses"],
+            "timeouts": _stats["timeouts"],
+            "cancelled": _stats["cancelled"],
+            "skipped": _stats["skipped"],
+            "queued": _queued,
+            "avg_pass_ms": (_stats["score_time_total"] / passes * 1000.0) if passes else 0.0,
+        }
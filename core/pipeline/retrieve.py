@@ -1,30 +1,127 @@
 # core/pipeline/retrieve.py
-from typing import Optional, List, Any
-from core.services.qdrant_service import search_vectors
+import asyncio
+from typing import Optional, List, Any, Dict
+from core.services.vector_store import asearch_vectors, asearch_vectors_batch
+from core.services import lexical_index
+from core.pipeline import rerank
 from config.settings import settings
 
-def run_retrieval(
+def _hit_fields(hit) -> tuple:
+    # qdrant returns ScoredPoint objects, the lexical index plain dicts
+    if isinstance(hit, dict):
+        return str(hit.get("id")), hit.get("payload")
+    return str(getattr(hit, "id", None)), getattr(hit, "payload", None)
+
+def rrf_fuse(result_lists: List[List[Any]], top_k: int, k: int = 60) -> List[Dict[str, Any]]:
+    """
+    Reciprocal rank fusion: score(d) = sum over lists of 1 / (k + rank(d)).
+    Only ranks are used, so dense cosine scores and BM25 scores need no calibration.
+    Returns [{"id", "payload", "score"}] best first.
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, hit in enumerate(results, start=1):
+            point_id, payload = _hit_fields(hit)
+            entry = fused.setdefault(point_id, {"id": point_id, "payload": payload, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda e: e["score"], reverse=True)[:top_k]
+
+def _as_hit(hit) -> Dict[str, Any]:
+    if isinstance(hit, dict):
+        return hit
+    point_id, payload = _hit_fields(hit)
+    return {"id": point_id, "payload": payload, "score": getattr(hit, "score", None)}
+
+def _plan(top_k: Optional[int], query: Optional[str]) -> Dict[str, Any]:
+    # how many hits each stage needs: final k, candidates for rerank, dense/lexical depth
+    use_rerank = bool(query) and rerank.available()
+    hybrid = bool(query) and settings.HYBRID_ENABLED
+    k = top_k or (settings.RERANK_TOP_K if use_rerank else settings.TOP_K)
+    fetch = max(k, settings.RERANK_CANDIDATES) if use_rerank else k
+    depth = max(fetch, settings.HYBRID_CANDIDATES) if hybrid else fetch
+    return {"k": k, "fetch": fetch, "depth": depth, "rerank": use_rerank, "hybrid": hybrid}
+
+async def _lexical(query: str, plan: Dict[str, Any], lang: Optional[str], module: Optional[str]) -> List[Any]:
+    # a failing lexical search degrades to dense-only
+    try:
+        return await lexical_index.search(query, plan["depth"], module=module, lang=lang)
+    except Exception:
+        return []
+
+async def _finish(query: Optional[str], plan: Dict[str, Any], dense: List[Any], lexical: Optional[List[Any]], batch: bool = False) -> List[Any]:
+    hits = rrf_fuse([dense, lexical], plan["fetch"], settings.RRF_K) if plan["hybrid"] else dense
+    if plan["rerank"]:
+        return await rerank.rerank(query, [_as_hit(h) for h in hits], plan["k"], batch=batch)
+    return hits
+
+async def run_retrieval(
     vector: List[float],
     lang: Optional[str] = None,
     top_k: Optional[int] = None,
-    module: Optional[str] = None
+    module: Optional[str] = None,
+    query: Optional[str] = None
 ) -> List[Any]:
     """
-    Run retrieval using qdrant_service.search_vectors.
+    Run retrieval using vector_store.asearch_vectors (Qdrant or the local index), plus the BM25 lexical index
+    when `query` is given and HYBRID_ENABLED.
 
     - vector: embedding vector of the query
     - lang: preferred language code (e.g. 'ja' or 'en')
     - top_k: override for number of hits
     - module: optional module name to restrict search
+    - query: raw query text for the lexical search and the reranker
+    Hybrid mode fetches HYBRID_CANDIDATES from both searches concurrently and fuses
+    them with RRF; a failing lexical search degrades to dense-only.
+    With a reranker available, RERANK_CANDIDATES hits are retrieved and the best
+    top_k (default RERANK_TOP_K) are kept by cross-encoder score.
     """
-    k = top_k or settings.TOP_K
-    # call the qdrant helper (synchronous)
-    hits = search_vectors(
+    plan = _plan(top_k, query)
+    # call the vector store helper (async, does not block the event loop)
+    dense_search = asearch_vectors(
         collection=settings.QDRANT_COLLECTION,
         vector=vector,
-        top_k=k,
+        top_k=plan["depth"],
         module=module,
         user_lang=lang,
         with_payload=True
     )
-    return hits
+    if plan["hybrid"]:
+        dense, lexical = await asyncio.gather(dense_search, _lexical(query, plan, lang, module))
+    else:
+        dense, lexical = await dense_search, None
+    return await _finish(query, plan, dense, lexical)
+
+async def run_retrieval_batch(
+    vectors: List[List[float]],
+    queries: List[Optional[str]],
+    langs: List[Optional[str]],
+    modules: List[Optional[str]],
+    top_k: Optional[int] = None
+) -> List[List[Any]]:
+    """
+    run_retrieval for many queries at once: all dense searches go out as one batch
+    request (vector_store.asearch_vectors_batch), lexical searches run concurrently.
+    Reranking runs one query at a time without the latency budget (rerank batch mode),
+    so results match run_retrieval and interactive reranks are not starved.
+    Returns one hit list per query, in input order.
+    """
+    if not vectors:
+        return []
+    plans = [_plan(top_k, q) for q in queries]
+    depth = max(p["depth"] for p in plans)
+    dense_all = asearch_vectors_batch(
+        collection=settings.QDRANT_COLLECTION,
+        vectors=vectors,
+        top_k=depth,
+        scopes=list(zip(modules, langs)),
+        with_payload=True
+    )
+    lexical_all = asyncio.gather(*[
+        _lexical(q, p, lang, module) if p["hybrid"] else asyncio.sleep(0, None)
+        for q, p, lang, module in zip(queries, plans, langs, modules)
+    ])
+    dense_lists, lexical_lists = await asyncio.gather(dense_all, lexical_all)
+    results = []
+    for q, p, dense, lexical in zip(queries, plans, dense_lists, lexical_lists):
+        results.append(await _finish(q, p, dense[:p["depth"]], lexical, batch=True))
+    return results
@@ -0,0 +1,243 @@
+# core/services/embed_cache.py
+"""
+Persistent, content-addressed embedding cache used during ingestion.
+
+Vectors are keyed by sha256 of the whitespace-normalized chunk text and stored per
+embedding model under EMBED_CACHE_DIR:
+  <model>.f16     memory-mapped float16 matrix (EMBED_CACHE_MAX_ENTRIES x dim)
+  <model>.sqlite  index: text hash -> row slot, last use time
+  <model>.lock    file lock shared by all processes using the directory
+When the matrix is full the least recently used slots are reused.
+
+Several processes (uvicorn workers, ingest scripts) can share EMBED_CACHE_DIR: writers
+hold the file lock exclusively and allocate slots inside a BEGIN IMMEDIATE transaction,
+readers hold it shared, so a slot is never handed to two keys or overwritten mid-read.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # no flock (Windows): only one process may use a cache directory
+    fcntl = None
+
+from config.settings import settings
+
+CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS entries (
+    text_hash TEXT PRIMARY KEY,
+    slot INTEGER NOT NULL UNIQUE,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def text_key(text: str) -> str:
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, directory: Path, model: str, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model)
+        directory.mkdir(parents=True, exist_ok=True)
+        self._matrix_path = directory / f"{slug}.f16"
+        self._lock = threading.Lock()
+        self._lock_file = open(directory / f"{slug}.lock", "a+b")
+        # autocommit; writes use explicit BEGIN IMMEDIATE transactions (see _transaction)
+        self._db = sqlite3.connect(str(directory / f"{slug}.sqlite"), check_same_thread=False,
+                                   isolation_level=None, timeout=30)
+        with self._file_lock(exclusive=True):
+            self._db.executescript(CREATE_SQL)
+            # entry count as of this process's last write (other processes may have added more)
+            self._entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        self._dim: Optional[int] = None
+        self._matrix: Optional[np.memmap] = None
+        # inode of the open matrix file, to notice another process replacing it
+        self._inode: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes SQLite's write lock up front, so concurrent writers queue here
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def _expected_size(self, dim: int) -> int:
+        return self.max_entries * dim * np.dtype(np.float16).itemsize
+
+    def _refresh(self):
+        """
+        Map the matrix as it is on disk now (another process may have created or replaced it).
+        Leaves it unmapped when the file is missing or does not match the stored dim.
+        """
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        dim = int(row[0]) if row else None
+        try:
+            st = self._matrix_path.stat()
+        except FileNotFoundError:
+            st = None
+        if dim is None or st is None or st.st_size != self._expected_size(dim):
+            self._matrix, self._dim, self._inode = None, dim, None
+            return
+        if self._matrix is not None and self._dim == dim and self._inode == st.st_ino:
+            return
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float16, mode="r+", shape=(self.max_entries, dim))
+        self._dim, self._inode = dim, st.st_ino
+
+    def _prepare_write(self, dim: int):
+        # caller holds the exclusive file lock
+        self._refresh()
+        if self._matrix is not None and self._dim == dim:
+            return
+        # no usable matrix (first write, file missing, EMBED_CACHE_MAX_ENTRIES or model dim
+        # changed): recreate it, and drop the index rows, which would point at zeroed slots
+        self._matrix = None
+        self._matrix_path.unlink(missing_ok=True)
+        with self._transaction():
+            self._db.execute("DELETE FROM entries")
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(dim),))
+        self._entries = 0
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float16, mode="w+", shape=(self.max_entries, dim))
+        self._dim, self._inode = dim, self._matrix_path.stat().st_ino
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """
+        Return {key: vector} for the keys present in the cache.
+        """
+        if not keys:
+            return {}
+        with self._lock, self._file_lock(exclusive=False):
+            found: Dict[str, List[float]] = {}
+            self._refresh()
+            if self._matrix is not None:
+                unique = list(dict.fromkeys(keys))
+                # stay well below SQLite's bound-parameter limit
+                for i in range(0, len(unique), 500):
+                    part = unique[i:i + 500]
+                    rows = self._db.execute(
+                        f"SELECT text_hash, slot FROM entries WHERE text_hash IN ({','.join('?' * len(part))})",
+                        part
+                    ).fetchall()
+                    for key, slot in rows:
+                        found[key] = self._matrix[slot].astype(np.float32).tolist()
+                if found:
+                    now = time.time()
+                    with self._transaction():
+                        self._db.executemany("UPDATE entries SET last_used = ? WHERE text_hash = ?", [(now, k) for k in found])
+            hits = sum(1 for k in keys if k in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+            return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        with self._lock, self._file_lock(exclusive=True):
+            self._prepare_write(len(next(iter(items.values()))))
+            with self._transaction():
+                known = set()
+                keys = list(items)
+                for i in range(0, len(keys), 500):
+                    part = keys[i:i + 500]
+                    known.update(r[0] for r in self._db.execute(
+                        f"SELECT text_hash FROM entries WHERE text_hash IN ({','.join('?' * len(part))})", part
+                    ))
+                new_keys = [k for k in keys if k not in known][:self.max_entries]
+                if not new_keys:
+                    return
+                slots = self._allocate(len(new_keys))
+                now = time.time()
+                for key, slot in zip(new_keys, slots):
+                    self._matrix[slot] = np.asarray(items[key], dtype=np.float16)
+                self._matrix.flush()
+                self._db.executemany(
+                    "INSERT INTO entries (text_hash, slot, last_used) VALUES (?, ?, ?)",
+                    [(k, s, now) for k, s in zip(new_keys, slots)]
+                )
+
+    def _allocate(self, n: int) -> List[int]:
+        # runs inside put_many's transaction, so no other process allocates at the same time.
+        # entries are only removed by eviction, which hands the slot straight to a new
+        # entry, so used slots are always 0..used-1: take free ones from the end, then evict LRU
+        used = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        slots = list(range(used, min(self.max_entries, used + n)))
+        self._entries = used + len(slots)
+        missing = n - len(slots)
+        if missing > 0:
+            victims = self._db.execute(
+                "SELECT text_hash, slot FROM entries ORDER BY last_used LIMIT ?", (missing,)
+            ).fetchall()
+            self._db.executemany("DELETE FROM entries WHERE text_hash = ?", [(v[0],) for v in victims])
+            slots.extend(v[1] for v in victims)
+            self.evictions += len(victims)
+        return slots
+
+    def stats(self) -> dict:
+        # called on the event loop (/metrics, /api/admin/stats): no lock and no SQL, since a
+        # put_many may hold both for a while during bulk ingest
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._entries,
+            "max_entries": self.max_entries,
+            "dim": self._dim,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[EmbeddingCache]:
+    """
+    The cache for settings.EMBED_MODEL, opened on first use; None when disabled.
+    """
+    global _cache
+    if not settings.EMBED_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(Path(settings.EMBED_CACHE_DIR), settings.EMBED_MODEL, settings.EMBED_CACHE_MAX_ENTRIES)
+        return _cache
+
+
+def stats() -> dict:
+    cache = _cache
+    return cache.stats() if cache is not None else {"enabled": settings.EMBED_CACHE_ENABLED, "entries": 0}
@@ -1,5 +1,6 @@
 # core/services/embedder.py
 import asyncio
+import time
 from typing import List, Optional
 try:
     from sentence_transformers import SentenceTransformer
@@ -7,6 +8,7 @@ except Exception:
     SentenceTransformer = None
 
 from config.settings import settings
+from core.services import embed_cache
 
 _st_model: Optional[SentenceTransformer] = None
 if SentenceTransformer:
@@ -15,25 +17,161 @@ if SentenceTransformer:
     except Exception:
         _st_model = None
 
-async def embed_texts(texts: List[str]) -> List[List[float]]:
+def _encode_batch(ts: List[str]) -> List[List[float]]:
+    # normalize_embeddings=True yields better cosine comparisons
+    return _st_model.encode(ts, normalize_embeddings=True).tolist()
+
+def _encode_batch_cached(ts: List[str]) -> List[List[float]]:
+    # look up the on-disk cache first and only encode the misses
+    cache = embed_cache.get_cache()
+    if cache is None:
+        return _encode_batch(ts)
+    keys = [embed_cache.text_key(t) for t in ts]
+    found = cache.get_many(keys)
+    missing = [i for i, k in enumerate(keys) if k not in found]
+    if missing:
+        encoded = _encode_batch([ts[i] for i in missing])
+        new_items = {}
+        for i, vec in zip(missing, encoded):
+            found[keys[i]] = vec
+            new_items[keys[i]] = vec
+        cache.put_many(new_items)
+    return [found[k] for k in keys]
+
+async def embed_texts(texts: List[str], use_cache: bool = False) -> List[List[float]]:
     """
     Batch embed a list of texts and return list of vectors (lists of floats).
     Uses SentenceTransformer in a thread to avoid blocking the event loop.
+    With use_cache=True (ingestion), vectors are read from / written to the
+    persistent embedding cache so identical chunk text is only encoded once.
     Returns empty list for each input if the model isn't available.
     """
     if _st_model is None:
         # fallback: return zero vectors to keep downstream code stable
         return [[0.0] * 768 for _ in texts]  # adjust dim if needed
     # run blocking encode in a thread
-    def _encode_batch(ts):
-        # normalize_embeddings=True yields better cosine comparisons
-        return _st_model.encode(ts, normalize_embeddings=True).tolist()
-    vectors = await asyncio.to_thread(_encode_batch, texts)
+    vectors = await asyncio.to_thread(_encode_batch_cached if use_cache else _encode_batch, texts)
     return vectors
 
+
+class EmbedBatcher:
+    """
+    Collects concurrent single-text embed requests and encodes them together.
+
+    A worker task takes the first queued request, then keeps collecting for up to
+    max_wait_ms or until max_batch_size requests are gathered, runs one encode in a
+    thread and resolves every caller's future. Only one encode runs at a time, so
+    requests arriving meanwhile pile up and form the next batch.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float, max_queue: int):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # counters
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self.max_batch_seen = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.total_encode_time = 0.0
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        # queue and worker are bound to one event loop (scripts may call asyncio.run repeatedly)
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            if self._loop is not loop:
+                self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._loop = loop
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, text: str) -> List[float]:
+        self._ensure_worker()
+        fut = self._loop.create_future()
+        # put() waits when the queue is full, which pushes back on callers
+        await self._queue.put((text, fut, time.perf_counter()))
+        return await fut
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # take whatever is already queued without waiting
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # callers that were cancelled while queued don't need encoding
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                waited = started - enqueued
+                self.total_queue_wait += waited
+                self.max_queue_wait = max(self.max_queue_wait, waited)
+            try:
+                vectors = await asyncio.to_thread(_encode_batch, [text for text, _, _ in batch])
+            except Exception as exc:
+                self.errors += 1
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(exc)
+                continue
+            self.total_encode_time += time.perf_counter() - started
+            self.batches += 1
+            self.items += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            for (_, fut, _), vec in zip(batch, vectors):
+                if not fut.done():
+                    fut.set_result(vec)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches,
+            "items": self.items,
+            "errors": self.errors,
+            "avg_batch_size": (self.items / self.batches) if self.batches else 0.0,
+            "max_batch_seen": self.max_batch_seen,
+            "avg_queue_wait_ms": (self.total_queue_wait / self.items * 1000.0) if self.items else 0.0,
+            "max_queue_wait_ms": self.max_queue_wait * 1000.0,
+            "avg_encode_ms": (self.total_encode_time / self.batches * 1000.0) if self.batches else 0.0,
+        }
+
+
+_batcher = EmbedBatcher(
+    max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+    max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS,
+    max_queue=settings.EMBED_QUEUE_MAX,
+)
+
 async def embed_text(text: str) -> List[float]:
     """
-    Embed a single text (wrapper around embed_texts).
+    Embed a single text. Concurrent calls are micro-batched into one encode.
     """
-    vecs = await embed_texts([text])
-    return vecs[0] if vecs else []
+    if _st_model is None:
+        vecs = await embed_texts([text])
+        return vecs[0] if vecs else []
+    return await _batcher.submit(text)
+
+def stats() -> dict:
+    return _batcher.stats()
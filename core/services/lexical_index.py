@@ -0,0 +1,77 @@
+# core/services/lexical_index.py
+"""
+Local BM25 index over ingested chunks (SQLite FTS5, see db/lexical.py).
+
+Complements dense search for exact terms: product names, error codes and
+Japanese terms. Text is normalized (NFKC, lowercase) and split into
+- latin words / codes, keeping inner '-', '.', '_' (e.g. "err-1234", "v2.1")
+- CJK character bigrams (e.g. "接続エラー" -> 接続 続エ エラ ラー), so Japanese
+  needs no morphological analyzer
+The same tokenizer is used for chunks and queries.
+"""
+import re
+import unicodedata
+from typing import List, Optional
+
+import db.lexical as lexical_db
+
+# hiragana, katakana, CJK ideographs (incl. ext. A and compatibility)
+_CJK = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN_RE = re.compile(
+    rf"(?P<cjk>[{_CJK}]+)|(?P<word>[0-9a-z\u00c0-\u024f]+(?:[-._][0-9a-z\u00c0-\u024f]+)*)"
+)
+# cap on distinct query terms handed to MATCH
+MAX_QUERY_TOKENS = 64
+
+
+def tokenize(text: str) -> List[str]:
+    tokens: List[str] = []
+    for m in _TOKEN_RE.finditer(unicodedata.normalize("NFKC", text).lower()):
+        run = m.group("cjk")
+        if run is None:
+            tokens.append(m.group("word"))
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _match_expr(query: str) -> Optional[str]:
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+    if not terms:
+        return None
+    # quoted so FTS5 operators/punctuation in the query are taken literally
+    return " OR ".join(f'"{t}"' for t in terms)
+
+
+async def index_points(points: List[dict]):
+    """
+    Index points as built by ingestion ({"id", "payload", ...}); payload["text"] is tokenized.
+    """
+    await lexical_db.upsert_chunks([
+        (str(p["id"]), p["payload"], " ".join(tokenize(p["payload"].get("text", "")))) for p in points
+    ])
+
+
+async def delete_points(ids: List[str]):
+    await lexical_db.delete_chunks([str(i) for i in ids])
+
+
+async def delete_module(module: str):
+    await lexical_db.delete_module(module)
+
+
+async def search(query: str, top_k: int, module: Optional[str] = None, lang: Optional[str] = None) -> List[dict]:
+    """
+    BM25 search with the same fallback as the dense search: module+lang first,
+    then module-only when both were given and nothing matched.
+    Returns [{"id", "payload", "score"}], best first (score = -bm25, higher is better).
+    """
+    match = _match_expr(query)
+    if match is None:
+        return []
+    rows = await lexical_db.search(match, top_k, module=module, lang=lang)
+    if not rows and module and lang:
+        rows = await lexical_db.search(match, top_k, module=module)
+    return [{"id": pid, "payload": payload, "score": -score} for pid, payload, score in rows]
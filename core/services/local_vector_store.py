@@ -0,0 +1,323 @@
+# core/services/local_vector_store.py
+"""
+In-process vector index, a drop-in for the Qdrant helpers used by the app
+(VECTOR_BACKEND=local). Meant for small deployments and for running offline.
+
+Per collection, under LOCAL_VECTOR_DIR:
+  <collection>.vec     memory-mapped matrix (capacity x dim, LOCAL_VECTOR_DTYPE),
+                       rows L2-normalized so cosine similarity is a dot product
+  <collection>.sqlite  slot -> point id, module, lang, filename, payload
+Filter columns are kept in RAM as integer-coded NumPy arrays, so module/lang
+filters are boolean masks and a search is one vectorized matmul plus top-k.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.settings import settings
+
+CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS points (
+    slot INTEGER PRIMARY KEY,
+    point_id TEXT UNIQUE NOT NULL,
+    module TEXT,
+    lang TEXT,
+    filename TEXT,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# initial rows allocated on first upsert; the matrix doubles when full
+_INITIAL_CAPACITY = 1024
+
+
+class _Codes:
+    """Maps filter values (module, lang, ...) to small ints; 0 means missing."""
+
+    def __init__(self):
+        self._codes: Dict[str, int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        if value not in self._codes:
+            self._codes[value] = len(self._codes) + 1
+        return self._codes[value]
+
+    def lookup(self, value: str) -> int:
+        # -1 never matches a stored code
+        return self._codes.get(value, -1)
+
+
+class LocalVectorIndex:
+    def __init__(self, directory: Path, name: str, dtype: str):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.dtype = np.dtype(dtype)
+        self._matrix_path = directory / f"{name}.vec"
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(directory / f"{name}.sqlite"), check_same_thread=False)
+        self._db.executescript(CREATE_SQL)
+        self._matrix: Optional[np.memmap] = None
+        self.dim: Optional[int] = None
+        self.capacity = 0
+        self._codes = {"module": _Codes(), "lang": _Codes(), "filename": _Codes()}
+        self._columns: Dict[str, np.ndarray] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids: List[Optional[str]] = []
+        self._payloads: List[Optional[dict]] = []
+        self._slot_of: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._load()
+
+    # ---- storage ----
+    def _load(self):
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        if not row or not self._matrix_path.exists():
+            return
+        self.dim = int(row[0])
+        rows_in_file = self._matrix_path.stat().st_size // (self.dim * self.dtype.itemsize)
+        self._open_matrix(rows_in_file)
+        self._resize_columns(rows_in_file)
+        for slot, point_id, module, lang, filename, payload in self._db.execute(
+            "SELECT slot, point_id, module, lang, filename, payload FROM points"
+        ):
+            self._set_row_meta(slot, point_id, {"module": module, "lang": lang, "filename": filename}, json.loads(payload))
+        self._free = [s for s in range(self.capacity - 1, -1, -1) if not self._alive[s]]
+
+    def _open_matrix(self, rows: int):
+        mode = "r+" if self._matrix_path.exists() else "w+"
+        self._matrix = np.memmap(self._matrix_path, dtype=self.dtype, mode=mode, shape=(rows, self.dim))
+        self.capacity = rows
+
+    def _resize_columns(self, rows: int):
+        grow = rows - len(self._alive)
+        for key in self._codes:
+            self._columns[key] = np.concatenate([self._columns.get(key, np.zeros(0, dtype=np.int32)), np.zeros(grow, dtype=np.int32)])
+        self._alive = np.concatenate([self._alive, np.zeros(grow, dtype=bool)])
+        self._ids.extend([None] * grow)
+        self._payloads.extend([None] * grow)
+
+    def _grow(self, needed: int):
+        if len(self._free) >= needed:
+            return
+        used = self.capacity - len(self._free)
+        new_capacity = max(_INITIAL_CAPACITY, self.capacity)
+        while new_capacity - used < needed:
+            new_capacity *= 2
+        if self._matrix is not None:
+            self._matrix.flush()
+            del self._matrix
+        # rows are contiguous, so extending the file keeps existing vectors in place
+        with open(self._matrix_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * self.dtype.itemsize)
+        old_capacity = self.capacity
+        self._open_matrix(new_capacity)
+        self._resize_columns(new_capacity)
+        self._free = list(range(new_capacity - 1, old_capacity - 1, -1)) + self._free
+
+    def _set_row_meta(self, slot: int, point_id: str, fields: Dict[str, Optional[str]], payload: dict):
+        for key, codes in self._codes.items():
+            self._columns[key][slot] = codes.code(fields.get(key))
+        self._alive[slot] = True
+        self._ids[slot] = point_id
+        self._payloads[slot] = payload
+        self._slot_of[point_id] = slot
+
+    def _clear_slot(self, slot: int):
+        self._slot_of.pop(self._ids[slot], None)
+        self._alive[slot] = False
+        self._ids[slot] = None
+        self._payloads[slot] = None
+        for key in self._codes:
+            self._columns[key][slot] = 0
+        self._free.append(slot)
+
+    # ---- operations ----
+    def upsert(self, points: List[dict]):
+        if not points:
+            return
+        with self._lock:
+            if self.dim is None:
+                # first write decides the vector size
+                self.dim = len(points[0]["vector"])
+                self._matrix_path.unlink(missing_ok=True)
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+            new = sum(1 for p in points if str(p["id"]) not in self._slot_of)
+            self._grow(new)
+            rows = []
+            for p in points:
+                point_id = str(p["id"])
+                payload = p.get("payload") or {}
+                slot = self._slot_of.get(point_id)
+                if slot is None:
+                    slot = self._free.pop()
+                vec = np.asarray(p["vector"], dtype=np.float32)
+                norm = np.linalg.norm(vec)
+                self._matrix[slot] = (vec / norm if norm else vec).astype(self.dtype)
+                self._set_row_meta(slot, point_id, payload, payload)
+                rows.append((slot, point_id, payload.get("module"), payload.get("lang"), payload.get("filename"),
+                             json.dumps(payload, ensure_ascii=False)))
+            self._matrix.flush()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO points (slot, point_id, module, lang, filename, payload) VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._db.commit()
+
+    def set_payloads(self, updates: Dict[str, dict]):
+        with self._lock:
+            rows = []
+            for point_id, fields in updates.items():
+                slot = self._slot_of.get(str(point_id))
+                if slot is None:
+                    continue
+                payload = {**self._payloads[slot], **fields}
+                self._set_row_meta(slot, str(point_id), payload, payload)
+                rows.append((payload.get("module"), payload.get("lang"), payload.get("filename"),
+                             json.dumps(payload, ensure_ascii=False), slot))
+            self._db.executemany("UPDATE points SET module = ?, lang = ?, filename = ?, payload = ? WHERE slot = ?", rows)
+            self._db.commit()
+
+    def _delete_slots(self, slots: List[int]):
+        for slot in slots:
+            self._clear_slot(slot)
+        for i in range(0, len(slots), 500):
+            part = slots[i:i + 500]
+            self._db.execute(f"DELETE FROM points WHERE slot IN ({','.join('?' * len(part))})", part)
+        self._db.commit()
+
+    def delete_ids(self, ids: Sequence[str]):
+        with self._lock:
+            self._delete_slots([self._slot_of[str(i)] for i in ids if str(i) in self._slot_of])
+
+    def _mask(self, **filters: Optional[str]) -> np.ndarray:
+        # None means "any value"; every other value, "" included, must match exactly
+        # (like the Qdrant payload filters), so delete_by(module="") can't hit every point
+        mask = self._alive.copy()
+        for key, value in filters.items():
+            # no columns before the first upsert; the mask is empty then anyway
+            if value is not None and key in self._columns:
+                mask &= self._columns[key] == self._codes[key].lookup(value)
+        return mask
+
+    def delete_by(self, **filters: Optional[str]):
+        with self._lock:
+            self._delete_slots(np.flatnonzero(self._mask(**filters)).tolist())
+
+    def payloads_by(self, fields: Sequence[str], **filters: Optional[str]) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                self._ids[s]: {f: self._payloads[s].get(f) for f in fields if f in self._payloads[s]}
+                for s in np.flatnonzero(self._mask(**filters))
+            }
+
+    def search(self, vector: List[float], top_k: int, module: Optional[str] = None, lang: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            if self._matrix is None:
+                return []
+            # an empty module/lang doesn't filter the search, as in qdrant_service._build_filter
+            slots = np.flatnonzero(self._mask(module=module or None, lang=lang or None))
+            if not len(slots):
+                return []
+            q = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(q)
+            if norm:
+                q = q / norm
+            # float16 has no BLAS matmul; upcast the selected rows
+            scores = self._matrix[slots].astype(np.float32, copy=False) @ q
+            k = min(top_k, len(slots))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [{"id": self._ids[slots[i]], "payload": self._payloads[slots[i]], "score": float(scores[i])} for i in best]
+
+    def count(self) -> int:
+        return int(self._alive.sum())
+
+    def close(self):
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            self._db.close()
+
+
+_indexes: Dict[str, LocalVectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(collection: str) -> LocalVectorIndex:
+    with _indexes_lock:
+        if collection not in _indexes:
+            _indexes[collection] = LocalVectorIndex(Path(settings.LOCAL_VECTOR_DIR), collection, settings.LOCAL_VECTOR_DTYPE)
+        return _indexes[collection]
+
+
+# ---- qdrant_service-compatible async API ----
+# memmap flushes, SQLite commits and NumPy scans block, so they run in worker threads
+# (each index serializes its own operations with a lock)
+async def aupsert(collection: str, points: List[dict]):
+    await asyncio.to_thread(lambda: get_index(collection).upsert(points))
+
+async def adelete_by_module(collection: str, module_name: str):
+    await asyncio.to_thread(lambda: get_index(collection).delete_by(module=module_name))
+
+async def afile_point_payloads(collection: str, module_name: str, filename: str, fields: Sequence[str]) -> Dict[str, dict]:
+    return await asyncio.to_thread(lambda: get_index(collection).payloads_by(fields, module=module_name, filename=filename))
+
+async def adelete_points(collection: str, ids: List[str]):
+    await asyncio.to_thread(lambda: get_index(collection).delete_ids(ids))
+
+async def aset_payloads(collection: str, updates: Dict[str, dict]):
+    await asyncio.to_thread(lambda: get_index(collection).set_payloads(updates))
+
+def _search(collection: str, vector: List[float], top_k: int, module: Optional[str], user_lang: Optional[str]) -> List[dict]:
+    index = get_index(collection)
+    hits = index.search(vector, top_k, module=module, lang=user_lang)
+    if not hits and module and user_lang:
+        hits = index.search(vector, top_k, module=module)
+    return hits
+
+async def asearch_vectors(
+    collection: str,
+    vector: List[float],
+    top_k: int = 6,
+    module: Optional[str] = None,
+    user_lang: Optional[str] = None,
+    with_payload: bool = True
+) -> List[Any]:
+    """
+    Same filters and fallback as qdrant_service.asearch_vectors: module+lang first,
+    then module-only when both were given and nothing matched.
+    """
+    return await asyncio.to_thread(_search, collection, vector, top_k, module, user_lang)
+
+async def asearch_vectors_batch(
+    collection: str,
+    vectors: List[List[float]],
+    top_k: int = 6,
+    scopes: Optional[List[Tuple[Optional[str], Optional[str]]]] = None,
+    with_payload: bool = True
+) -> List[List[Any]]:
+    scopes = scopes or [(None, None)] * len(vectors)
+    # one thread hop for the whole batch
+    return await asyncio.to_thread(
+        lambda: [_search(collection, v, top_k, module, lang) for v, (module, lang) in zip(vectors, scopes)]
+    )
+
+async def aclose():
+    def close_all():
+        with _indexes_lock:
+            for index in _indexes.values():
+                index.close()
+            _indexes.clear()
+    await asyncio.to_thread(close_all)
+
+def stats() -> dict:
+    return {name: {"points": index.count(), "capacity": index.capacity, "dim": index.dim} for name, index in _indexes.items()}
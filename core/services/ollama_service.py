@@ -1,14 +1,162 @@
+import asyncio
+import json
+import time
 import httpx
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
 from config.settings import settings
+from core.utils import metrics
 
 
-client = httpx.AsyncClient(timeout=300)
+client = httpx.AsyncClient(
+    timeout=settings.OLLAMA_TIMEOUT,
+    limits=httpx.Limits(max_connections=max(1, settings.OLLAMA_MAX_INFLIGHT) * 2, max_keepalive_connections=max(1, settings.OLLAMA_MAX_INFLIGHT)),
+)
+
+
+class OllamaOverloaded(Exception):
+    """Raised when a generation cannot get a slot (wait queue full or queue timeout)."""
+
+
+class GenerationScheduler:
+    """
+    Admission control in front of Ollama.
+    - at most max_inflight generations are sent at once (match OLLAMA_NUM_PARALLEL on
+      the server, so Ollama itself never queues behind our back)
+    - up to max_queue more callers wait for a slot, each for at most queue_timeout seconds
+    - anything beyond that is rejected immediately with OllamaOverloaded (HTTP 503)
+    """
+
+    def __init__(self, max_inflight: int, max_queue: int, queue_timeout: float):
+        self.max_inflight = max(1, max_inflight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.inflight = 0
+        self.waiting = 0
+        # counters
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+
+    def _bind_loop(self):
+        # asyncio primitives belong to one event loop; recreated if the loop changes (scripts)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_inflight)
+
+    @asynccontextmanager
+    async def slot(self):
+        self._bind_loop()
+        # waiting is counted before the first await, so concurrent arrivals see each other
+        if self.inflight + self.waiting >= self.max_inflight + self.max_queue:
+            self.rejected += 1
+            raise OllamaOverloaded("generation queue is full")
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise OllamaOverloaded(f"no generation slot within {self.queue_timeout:g}s")
+        finally:
+            self.waiting -= 1
+        waited = time.perf_counter() - started
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        self.admitted += 1
+        self.inflight += 1
+        running = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.inflight -= 1
+            self.run_total += time.perf_counter() - running
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_inflight": self.max_inflight,
+            "max_queue": self.max_queue,
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queue_timeouts": self.timeouts,
+            "failed": self.failed,
+            "avg_wait_ms": (self.wait_total / self.admitted * 1000.0) if self.admitted else 0.0,
+            "max_wait_ms": self.wait_max * 1000.0,
+            "avg_generation_ms": (self.run_total / self.admitted * 1000.0) if self.admitted else 0.0,
+        }
+
+
+_scheduler = GenerationScheduler(settings.OLLAMA_MAX_INFLIGHT, settings.OLLAMA_MAX_QUEUE, settings.OLLAMA_QUEUE_TIMEOUT)
+
+
+def _count_tokens(data: dict):
+    # the final response carries prompt_eval_count (tokens in) and eval_count (tokens out)
+    metrics.LLM_PROMPT_TOKENS.inc(data.get("prompt_eval_count") or 0)
+    metrics.LLM_COMPLETION_TOKENS.inc(data.get("eval_count") or 0)
+
+
+def _payload(prompt: str, model: str, stream: bool) -> dict:
+    # keep_alive keeps the model loaded between requests; options bound context and answer length
+    return {
+        "model": model,
+        "prompt": prompt,
+        "stream": stream,
+        "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+        "options": {"num_ctx": settings.OLLAMA_NUM_CTX, "num_predict": settings.OLLAMA_NUM_PREDICT},
+    }
 
 
 async def generate(prompt: str, model: str = None):
+    """
+    Non-streaming completion. Raises OllamaOverloaded when no generation slot is available.
+    """
+    model = model or settings.LLM_MODEL
+    url = f"{settings.OLLAMA_URL.rstrip('/')}/api/generate"
+    async with _scheduler.slot():
+        r = await client.post(url, json=_payload(prompt, model, False))
+        r.raise_for_status()
+        data = r.json()
+        _count_tokens(data)
+        return data
+
+
+async def generate_stream(prompt: str, model: str = None) -> AsyncIterator[str]:
+    """
+    Stream a completion from Ollama, yielding response text fragments as they arrive.
+    Ollama answers with NDJSON: one JSON object per line, the last one has "done": true.
+    The generation slot is held until the stream ends; raises OllamaOverloaded like generate().
+    """
     model = model or settings.LLM_MODEL
     url = f"{settings.OLLAMA_URL.rstrip('/')}/api/generate"
-    payload = {"model": model, "prompt": prompt, "stream": False}
-    r = await client.post(url, json=payload)
-    r.raise_for_status()
-    return r.json()
\ No newline at end of file
+    async with _scheduler.slot():
+        async with client.stream("POST", url, json=_payload(prompt, model, True)) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                token = chunk.get("response")
+                if token:
+                    yield token
+                if chunk.get("done"):
+                    _count_tokens(chunk)
+                    break
+
+
+def stats() -> dict:
+    return _scheduler.stats()
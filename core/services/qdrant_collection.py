@@ -0,0 +1,176 @@
+# core/services/qdrant_collection.py
+"""
+Create or migrate the Qdrant collection (settings.QDRANT_COLLECTION) so that:
+- original float32 vectors live on disk (QDRANT_VECTORS_ON_DISK)
+- an int8 scalar-quantized copy is kept in RAM for the HNSW search (QDRANT_QUANTIZATION),
+  about 4x less memory per vector; results are rescored with the originals at query time
+- the HNSW graph uses QDRANT_HNSW_M / QDRANT_HNSW_EF_CONSTRUCT
+- module, lang and filename have keyword payload indexes (PAYLOAD_INDEXES)
+Run through `python scripts/init_db.py --collection`; payload indexes are also
+ensured at app startup.
+"""
+import asyncio
+from typing import Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, VectorParamsDiff, HnswConfigDiff,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, Disabled,
+    KeywordIndexParams, KeywordIndexType, PayloadSchemaType,
+)
+from config.settings import settings
+
+
+def _quantization():
+    if settings.QDRANT_QUANTIZATION != "int8":
+        return None
+    return ScalarQuantization(scalar=ScalarQuantizationConfig(
+        type=ScalarType.INT8,
+        quantile=settings.QDRANT_QUANTIZATION_QUANTILE,
+        always_ram=True,
+    ))
+
+
+def _hnsw() -> HnswConfigDiff:
+    return HnswConfigDiff(m=settings.QDRANT_HNSW_M, ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT)
+
+
+def embedding_dim() -> int:
+    """
+    Vector size: EMBED_DIM if set, otherwise asked from the loaded embedding model.
+    """
+    if settings.EMBED_DIM:
+        return settings.EMBED_DIM
+    from core.services import embedder
+    if embedder._st_model is None:
+        raise RuntimeError("Embedding model not loaded; set EMBED_DIM or pass --dim")
+    return embedder._st_model.get_sentence_embedding_dimension()
+
+
+def ensure_collection(client: QdrantClient, collection: Optional[str] = None, dim: Optional[int] = None, recreate: bool = False) -> dict:
+    """
+    Create the collection if missing (or when recreate=True, dropping its points), otherwise
+    bring its on-disk, HNSW and quantization settings in line with settings.
+    Idempotent; returns {"collection", "action", "changed": [...]}.
+    """
+    collection = collection or settings.QDRANT_COLLECTION
+    dim = dim or embedding_dim()
+    exists = client.collection_exists(collection)
+    if exists and recreate:
+        client.delete_collection(collection)
+        exists = False
+    if not exists:
+        client.create_collection(
+            collection_name=collection,
+            vectors_config=VectorParams(size=dim, distance=Distance.COSINE, on_disk=settings.QDRANT_VECTORS_ON_DISK),
+            hnsw_config=_hnsw(),
+            quantization_config=_quantization(),
+        )
+        return {"collection": collection, "action": "created", "changed": []}
+
+    config = client.get_collection(collection).config
+    params = config.params.vectors
+    if not isinstance(params, VectorParams):
+        raise RuntimeError(f"Collection {collection} uses named vectors; migrate it manually")
+    if params.size != dim:
+        raise RuntimeError(f"Collection {collection} has vector size {params.size}, embedder gives {dim}; use --recreate and re-ingest")
+
+    changed = []
+    update = {}
+    if bool(params.on_disk) != settings.QDRANT_VECTORS_ON_DISK:
+        update["vectors_config"] = {"": VectorParamsDiff(on_disk=settings.QDRANT_VECTORS_ON_DISK)}
+        changed.append("on_disk")
+    hnsw = config.hnsw_config
+    if hnsw is None or (hnsw.m, hnsw.ef_construct) != (settings.QDRANT_HNSW_M, settings.QDRANT_HNSW_EF_CONSTRUCT):
+        update["hnsw_config"] = _hnsw()
+        changed.append("hnsw")
+    wanted = _quantization()
+    current = config.quantization_config
+    if wanted is None and current is not None:
+        update["quantization_config"] = Disabled.DISABLED
+        changed.append("quantization")
+    elif wanted is not None and (not isinstance(current, ScalarQuantization) or current.scalar != wanted.scalar):
+        update["quantization_config"] = wanted
+        changed.append("quantization")
+    if update:
+        # Qdrant rebuilds indexes / quantized vectors in the background
+        client.update_collection(collection_name=collection, **update)
+    return {"collection": collection, "action": "updated" if changed else "unchanged", "changed": changed}
+
+
+# every search and delete filters on these; module is the tenant key (one module per
+# query), so Qdrant co-locates each module's points and can skip the others
+PAYLOAD_INDEXES = {
+    "module": KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=True),
+    "lang": KeywordIndexParams(type=KeywordIndexType.KEYWORD),
+    "filename": KeywordIndexParams(type=KeywordIndexType.KEYWORD),
+}
+
+# result of the last ensure_payload_indexes() (startup), for /api/admin/stats
+_index_status: dict = {"checked": False}
+
+
+def _index_matches(info, params: KeywordIndexParams) -> bool:
+    if info is None or info.data_type != PayloadSchemaType.KEYWORD:
+        return False
+    # servers that predate tenant indexes report no params; accept those as is
+    return info.params is None or bool(getattr(info.params, "is_tenant", None)) == bool(params.is_tenant)
+
+
+def ensure_payload_indexes(client: QdrantClient, collection: Optional[str] = None) -> dict:
+    """
+    Create missing (or differently configured) keyword payload indexes, then check them.
+    Idempotent. Returns {"ok", "collection", "created": [...], "fields": {field: {...}}}.
+    """
+    global _index_status
+    collection = collection or settings.QDRANT_COLLECTION
+    if not client.collection_exists(collection):
+        _index_status = {"checked": True, "ok": False, "collection": collection, "error": "collection does not exist"}
+        return _index_status
+    schema = client.get_collection(collection).payload_schema or {}
+    created = []
+    for field, params in PAYLOAD_INDEXES.items():
+        if _index_matches(schema.get(field), params):
+            continue
+        if field in schema:
+            client.delete_payload_index(collection_name=collection, field_name=field, wait=True)
+        client.create_payload_index(collection_name=collection, field_name=field, field_schema=params, wait=True)
+        created.append(field)
+
+    # health: every index exists with the expected type
+    schema = client.get_collection(collection).payload_schema or {}
+    fields = {}
+    for field, params in PAYLOAD_INDEXES.items():
+        info = schema.get(field)
+        fields[field] = {
+            "ok": _index_matches(info, params),
+            "type": str(info.data_type.value) if info is not None else None,
+            "points": info.points if info is not None else 0,
+        }
+    _index_status = {
+        "checked": True,
+        "ok": all(f["ok"] for f in fields.values()),
+        "collection": collection,
+        "created": created,
+        "fields": fields,
+    }
+    return _index_status
+
+
+async def check_payload_indexes_at_startup():
+    """
+    ensure_payload_indexes() for the app lifespan: runs in a thread and never raises,
+    so an unreachable Qdrant does not block startup (the status records the problem).
+    """
+    global _index_status
+    from core.services.qdrant_service import qc
+    try:
+        status = await asyncio.to_thread(ensure_payload_indexes, qc)
+    except Exception as exc:
+        status = _index_status = {"checked": True, "ok": False, "error": str(exc)}
+    if not status["ok"]:
+        print("qdrant: payload indexes not healthy:", status)
+
+
+def payload_index_status() -> dict:
+    return _index_status
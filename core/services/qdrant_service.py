@@ -1,25 +1,159 @@
 # core/services/qdrant_service.py
-from typing import List, Optional, Any
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import (
+    Filter, FieldCondition, MatchValue, PointStruct, QueryRequest,
+    PointIdsList, SetPayload, SetPayloadOperation, SearchParams, QuantizationSearchParams,
+)
 from config.settings import settings
 
+# blocking client, kept for scripts and sync helpers
 qc = QdrantClient(url=settings.QDRANT_URL)
 
+# async client used by request handlers; one shared HTTP connection pool per worker
+aqc = AsyncQdrantClient(
+    url=settings.QDRANT_URL,
+    timeout=settings.QDRANT_TIMEOUT,
+    pool_size=settings.QDRANT_POOL_SIZE,
+    check_compatibility=False,  # the sync client already checks the server version
+)
+
+def search_params() -> SearchParams:
+    """
+    Query-time HNSW/quantization parameters from settings (quantization is ignored
+    by Qdrant for collections without it).
+    """
+    return SearchParams(
+        hnsw_ef=settings.QDRANT_HNSW_EF,
+        quantization=QuantizationSearchParams(rescore=settings.QDRANT_RESCORE, oversampling=settings.QDRANT_OVERSAMPLING),
+    )
+
 # Simple thin wrapper (kept for compatibility)
 def search(collection: str, vector: List[float], limit: int = 5, with_payload: bool = True, query_filter: Optional[Filter] = None):
-    return qc.search(collection_name=collection, query_vector=vector,
-                     limit=limit, with_payload=with_payload, query_filter=query_filter)
+    return qc.query_points(collection_name=collection, query=vector, limit=limit, with_payload=with_payload,
+                           query_filter=query_filter, search_params=search_params()).points
+
+def _as_points(points: List[dict]) -> List[PointStruct]:
+    return [PointStruct(**p) if isinstance(p, dict) else p for p in points]
 
 def upsert(collection: str, points: List[dict]):
-    return qc.upsert(collection_name=collection, points=points)
+    return qc.upsert(collection_name=collection, points=_as_points(points))
+
+async def aupsert(collection: str, points: List[dict]):
+    return await aqc.upsert(collection_name=collection, points=_as_points(points))
+
+def _module_filter(module_name: str) -> Filter:
+    return Filter(must=[FieldCondition(key="module", match=MatchValue(value=module_name))])
 
 def delete_by_module(collection: str, module_name: str):
     """
     Delete all points whose payload.module == module_name
     """
-    filt = Filter(must=[FieldCondition(key="module", match=MatchValue(value=module_name))])
-    return qc.delete(collection_name=collection, filter=filt)
+    return qc.delete(collection_name=collection, points_selector=_module_filter(module_name))
+
+async def adelete_by_module(collection: str, module_name: str):
+    """
+    Async variant of delete_by_module.
+    """
+    return await aqc.delete(collection_name=collection, points_selector=_module_filter(module_name))
+
+def _file_filter(module_name: str, filename: str) -> Filter:
+    return Filter(must=[
+        FieldCondition(key="module", match=MatchValue(value=module_name)),
+        FieldCondition(key="filename", match=MatchValue(value=filename)),
+    ])
+
+async def afile_point_payloads(collection: str, module_name: str, filename: str, fields: Sequence[str]) -> Dict[str, dict]:
+    """
+    Return {point_id: payload subset} for every point of one ingested file
+    (payload.module == module_name and payload.filename == filename).
+    """
+    out: Dict[str, dict] = {}
+    offset = None
+    while True:
+        points, offset = await aqc.scroll(
+            collection_name=collection,
+            scroll_filter=_file_filter(module_name, filename),
+            limit=1000,
+            offset=offset,
+            with_payload=list(fields),
+            with_vectors=False
+        )
+        for p in points:
+            out[str(p.id)] = p.payload or {}
+        if offset is None:
+            return out
+
+async def adelete_points(collection: str, ids: List[str]):
+    return await aqc.delete(collection_name=collection, points_selector=PointIdsList(points=ids))
+
+async def aset_payloads(collection: str, updates: Dict[str, dict]):
+    """
+    Merge new payload values into existing points without touching their vectors.
+    """
+    ops = [SetPayloadOperation(set_payload=SetPayload(payload=payload, points=[pid])) for pid, payload in updates.items()]
+    return await aqc.batch_update_points(collection_name=collection, update_operations=ops)
+
+def _build_filter(module: Optional[str], user_lang: Optional[str]) -> Optional[Filter]:
+    # build must conditions
+    must_conditions = []
+    if module:
+        must_conditions.append(FieldCondition(key="module", match=MatchValue(value=module)))
+    if user_lang:
+        must_conditions.append(FieldCondition(key="lang", match=MatchValue(value=user_lang)))
+    return Filter(must=must_conditions) if must_conditions else None
+
+
+def _fallback_filters(module: Optional[str], user_lang: Optional[str]) -> List[Optional[Filter]]:
+    """
+    Filters to try, in order of preference:
+    - module+lang (or whichever of the two is given)
+    - module-only, when both module and lang were given (cross-language fallback)
+    """
+    filters = [_build_filter(module, user_lang)]
+    if user_lang and module:
+        filters.append(_build_filter(module, None))
+    return filters
+
+def _batch_requests(vector: List[float], filters: List[Optional[Filter]], top_k: int, with_payload: bool) -> List[QueryRequest]:
+    params = search_params()
+    return [QueryRequest(query=vector, filter=f, limit=top_k, with_payload=with_payload, params=params) for f in filters]
+
+def _first_non_empty(responses) -> List[Any]:
+    # responses are in the same order as the filters; take the first one with hits
+    for res in responses:
+        if res.points:
+            return res.points
+    return []
+
+
+def search_filters(
+    collection: str,
+    vector: List[float],
+    filters: List[Optional[Filter]],
+    top_k: int = 6,
+    with_payload: bool = True
+) -> List[List[Any]]:
+    """
+    Run one search per filter in a single batch request.
+    Returns one list of scored points per filter, in the same order.
+    """
+    responses = qc.query_batch_points(collection_name=collection, requests=_batch_requests(vector, filters, top_k, with_payload))
+    return [res.points for res in responses]
+
+
+async def asearch_filters(
+    collection: str,
+    vector: List[float],
+    filters: List[Optional[Filter]],
+    top_k: int = 6,
+    with_payload: bool = True
+) -> List[List[Any]]:
+    """
+    Async variant of search_filters.
+    """
+    responses = await aqc.query_batch_points(collection_name=collection, requests=_batch_requests(vector, filters, top_k, with_payload))
+    return [res.points for res in responses]
 
 
 # New: language-aware search with fallback
@@ -33,38 +167,65 @@ def search_vectors(
 ) -> List[Any]:
     """
     Search vectors with optional 'module' and 'user_lang' filters.
-    - If user_lang is provided, tries module+lang search first.
-    - If that returns no results and module is provided, retries module-only search as fallback.
+    - If user_lang is provided, searches module+lang.
+    - If module is provided too, a module-only search is sent in the same batch request
+      and used as fallback when the module+lang search returns nothing.
     - If module not provided, just searches with or without lang filter.
-    Returns the list of hits from qdrant_client.search.
+    Returns the list of scored points.
+    Blocking; request handlers should use asearch_vectors.
     """
-    # build must conditions
-    must_conditions = []
-    if module:
-        must_conditions.append(FieldCondition(key="module", match=MatchValue(value=module)))
-    if user_lang:
-        must_conditions.append(FieldCondition(key="lang", match=MatchValue(value=user_lang)))
+    responses = qc.query_batch_points(
+        collection_name=collection,
+        requests=_batch_requests(vector, _fallback_filters(module, user_lang), top_k, with_payload)
+    )
+    return _first_non_empty(responses)
 
-    primary_filter = Filter(must=must_conditions) if must_conditions else None
 
-    # primary search
-    results = qc.search(
+async def asearch_vectors(
+    collection: str,
+    vector: List[float],
+    top_k: int = 6,
+    module: Optional[str] = None,
+    user_lang: Optional[str] = None,
+    with_payload: bool = True
+) -> List[Any]:
+    """
+    Async variant of search_vectors (same filters and fallback), backed by the shared AsyncQdrantClient.
+    """
+    responses = await aqc.query_batch_points(
         collection_name=collection,
-        query_vector=vector,
-        limit=top_k,
-        with_payload=with_payload,
-        query_filter=primary_filter
+        requests=_batch_requests(vector, _fallback_filters(module, user_lang), top_k, with_payload)
     )
+    return _first_non_empty(responses)
+
+
+async def asearch_vectors_batch(
+    collection: str,
+    vectors: List[List[float]],
+    top_k: int = 6,
+    scopes: Optional[List[Tuple[Optional[str], Optional[str]]]] = None,
+    with_payload: bool = True
+) -> List[List[Any]]:
+    """
+    asearch_vectors for many vectors in a single query_batch_points request.
+    scopes gives (module, user_lang) per vector. Returns one hit list per vector.
+    """
+    scopes = scopes or [(None, None)] * len(vectors)
+    requests: List[QueryRequest] = []
+    spans = []
+    for vector, (module, user_lang) in zip(vectors, scopes):
+        filters = _fallback_filters(module, user_lang)
+        requests.extend(_batch_requests(vector, filters, top_k, with_payload))
+        spans.append(len(filters))
+    if not requests:
+        return []
+    responses = await aqc.query_batch_points(collection_name=collection, requests=requests)
+    out, start = [], 0
+    for n in spans:
+        out.append(_first_non_empty(responses[start:start + n]))
+        start += n
+    return out
 
-    # fallback: if no results and we used language filter and module exists, try module-only
-    if (not results or len(results) == 0) and user_lang and module:
-        module_filter = Filter(must=[FieldCondition(key="module", match=MatchValue(value=module))])
-        results = qc.search(
-            collection_name=collection,
-            query_vector=vector,
-            limit=top_k,
-            with_payload=with_payload,
-            query_filter=module_filter
-        )
 
-    return results
+async def aclose():
+    await aqc.close()
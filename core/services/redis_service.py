@@ -1,7 +1,7 @@
 # core/services/redis_service.py
 
 import redis.asyncio as redis
-import hashlib, json
+import hashlib, json, secrets
 
 # Create global Redis client
 redis_client = redis.Redis(
@@ -21,3 +21,39 @@ async def get_cached_answer(q: str):
 async def set_cached_answer(q: str, answer: dict, ttl: int = 86400):
     key = key_for_question(q)
     await redis_client.set(key, json.dumps(answer), ex=ttl)
+
+
+# short-lived per-question locks, so only one worker answers a question that is not cached yet
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_EXTEND_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+def lock_key_for_question(q: str):
+    return "lock:" + key_for_question(q)
+
+async def acquire_question_lock(q: str, ttl_ms: int):
+    """Return a lock token if this caller now holds the lock, None if another caller does."""
+    token = secrets.token_hex(16)
+    ok = await redis_client.set(lock_key_for_question(q), token, nx=True, px=ttl_ms)
+    return token if ok else None
+
+async def release_question_lock(q: str, token: str):
+    # delete only if we still own it (the lock may have expired and been taken over)
+    await redis_client.eval(_RELEASE_LOCK, 1, lock_key_for_question(q), token)
+
+async def extend_question_lock(q: str, token: str, ttl_ms: int) -> bool:
+    """Reset the lock's expiry to ttl_ms if we still own it; False if it was lost."""
+    return bool(await redis_client.eval(_EXTEND_LOCK, 1, lock_key_for_question(q), token, ttl_ms))
+
+async def question_locked(q: str) -> bool:
+    return bool(await redis_client.exists(lock_key_for_question(q)))
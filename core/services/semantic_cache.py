@@ -0,0 +1,273 @@
+# core/services/semantic_cache.py
+"""
+Semantic answer cache.
+
+The Redis cache in redis_service only matches questions that are identical after
+lowercasing. This layer keeps the query embedding next to the cached answer and
+returns a previous answer when a new question is close enough (cosine similarity
+above SEMANTIC_CACHE_THRESHOLD) within the same lang/module scope.
+
+Entries are shared by all workers through Redis (SEMANTIC_CACHE_SHARED): every
+stored answer is appended with its normalized embedding to a per-scope sorted set
+(semcache:<lang>:<module>, scored by a global sequence, newest
+SEMANTIC_CACHE_MAX_ENTRIES kept). Each worker matches against an in-process copy
+of those entries and, before a lookup, pulls only the entries added since its last
+sync, so a lookup costs one small Redis round trip plus a matrix product.
+The in-process copy is bounded by SEMANTIC_CACHE_MAX_ENTRIES (LRU) and entries
+expire SEMANTIC_CACHE_TTL seconds after they were stored. Without Redis the cache
+keeps working per worker.
+"""
+import base64
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.services import redis_service
+from config.settings import settings
+
+Scope = Tuple[str, str]
+
+SEQ_KEY = "semcache:seq"
+
+# append an entry to a scope atomically with its sequence number, so a reader that has
+# seen sequence n never misses an entry < n that was still being written
+_PUBLISH = """
+local id = redis.call('incr', KEYS[1])
+redis.call('zadd', KEYS[2], id, ARGV[1])
+redis.call('zremrangebyrank', KEYS[2], 0, -tonumber(ARGV[2]) - 1)
+redis.call('expire', KEYS[2], ARGV[3])
+return id
+"""
+
+
+class _Entry:
+    __slots__ = ("scope", "vector", "value", "expires_at")
+
+    def __init__(self, scope: Scope, vector: np.ndarray, value: dict, expires_at: float):
+        self.scope = scope
+        self.vector = vector
+        self.value = value
+        self.expires_at = expires_at
+
+
+class SemanticCache:
+    def __init__(self, threshold: float, max_entries: int, ttl: int):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # entries only this worker has (Redis unavailable) get negative ids, shared ones their sequence
+        self._next_local_id = 0
+        # per scope: highest shared sequence already pulled from Redis
+        self._synced: Dict[Scope, int] = {}
+        # global LRU order (oldest first) across all scopes
+        self._lru: "OrderedDict[int, _Entry]" = OrderedDict()
+        # per-scope entry ids, plus a stacked matrix rebuilt lazily when the scope changes
+        self._by_scope: Dict[Scope, Dict[int, _Entry]] = {}
+        self._matrix: Dict[Scope, Tuple[List[int], np.ndarray]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _normalize(vector) -> Optional[np.ndarray]:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        if v.ndim != 1 or norm == 0.0:
+            # zero vectors (embedder fallback) would match everything
+            return None
+        return v / norm
+
+    def _remove(self, entry_id: int):
+        entry = self._lru.pop(entry_id, None)
+        if entry is None:
+            return
+        scoped = self._by_scope.get(entry.scope)
+        if scoped is not None:
+            scoped.pop(entry_id, None)
+            if not scoped:
+                del self._by_scope[entry.scope]
+        self._matrix.pop(entry.scope, None)
+
+    def _scope_matrix(self, scope: Scope) -> Optional[Tuple[List[int], np.ndarray]]:
+        cached = self._matrix.get(scope)
+        if cached is not None:
+            return cached
+        scoped = self._by_scope.get(scope)
+        if not scoped:
+            return None
+        ids = list(scoped.keys())
+        try:
+            mat = np.stack([scoped[i].vector for i in ids])
+        except ValueError:
+            # mixed dimensions (embed model changed at runtime); drop the scope
+            for i in ids:
+                self._remove(i)
+            return None
+        self._matrix[scope] = (ids, mat)
+        return ids, mat
+
+    def lookup(self, vector, lang: str, module: Optional[str]) -> Optional[Tuple[dict, float]]:
+        """
+        Return (cached_value, similarity) for the closest entry in scope, or None.
+        """
+        v = self._normalize(vector)
+        if v is None:
+            return None
+        scope = (lang or "", module or "")
+        now = time.time()
+        with self._lock:
+            # drop expired entries of this scope before matching
+            for entry_id, entry in list(self._by_scope.get(scope, {}).items()):
+                if entry.expires_at <= now:
+                    self._remove(entry_id)
+                    self.expirations += 1
+            found = self._scope_matrix(scope)
+            if found is None:
+                self.misses += 1
+                return None
+            ids, mat = found
+            if mat.shape[1] != v.shape[0]:
+                self.misses += 1
+                return None
+            sims = mat @ v
+            best = int(np.argmax(sims))
+            score = float(sims[best])
+            if score < self.threshold:
+                self.misses += 1
+                return None
+            entry_id = ids[best]
+            self._lru.move_to_end(entry_id)
+            self.hits += 1
+            return self._lru[entry_id].value, score
+
+    def _add(self, entry_id: int, entry: _Entry):
+        # caller holds the lock
+        if entry_id in self._lru:
+            return
+        self._lru[entry_id] = entry
+        self._by_scope.setdefault(entry.scope, {})[entry_id] = entry
+        self._matrix.pop(entry.scope, None)
+        while len(self._lru) > self.max_entries:
+            oldest = next(iter(self._lru))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def store(self, vector, lang: str, module: Optional[str], value: dict,
+              entry_id: Optional[int] = None) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        Add an entry to this worker's copy; entry_id is its shared sequence, if any.
+        Returns (normalized vector, expires_at) for publishing, or None if not cacheable.
+        """
+        v = self._normalize(vector)
+        if v is None:
+            return None
+        scope = (lang or "", module or "")
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            if entry_id is None:
+                self._next_local_id -= 1
+                entry_id = self._next_local_id
+            self._add(entry_id, _Entry(scope, v, value, expires_at))
+        return v, expires_at
+
+    def synced(self, scope: Scope) -> int:
+        with self._lock:
+            return self._synced.get(scope, 0)
+
+    def merge(self, scope: Scope, entries: List[Tuple[int, np.ndarray, dict, float]]):
+        """
+        Add entries (seq, normalized vector, value, expires_at) pulled from Redis for `scope`.
+        """
+        now = time.time()
+        with self._lock:
+            for seq, v, value, expires_at in entries:
+                if expires_at > now:
+                    self._add(seq, _Entry(scope, v, value, expires_at))
+                self._synced[scope] = max(self._synced.get(scope, 0), seq)
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self._by_scope.clear()
+            self._matrix.clear()
+            self._synced.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._lru),
+                "scopes": len(self._by_scope),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+semantic_cache = SemanticCache(
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl=settings.SEMANTIC_CACHE_TTL,
+)
+
+
+def _scope_key(scope: Scope) -> str:
+    return f"semcache:{scope[0]}:{scope[1]}"
+
+
+async def _pull(scope: Scope):
+    # fetch the scope's entries added by any worker since the last sync
+    rows = await redis_service.redis_client.zrangebyscore(
+        _scope_key(scope), f"({semantic_cache.synced(scope)}", "+inf", withscores=True)
+    entries = []
+    for member, seq in rows:
+        data = json.loads(member)
+        v = np.frombuffer(base64.b64decode(data["v"]), dtype=np.float32)
+        entries.append((int(seq), v, data["value"], float(data["exp"])))
+    if entries:
+        semantic_cache.merge(scope, entries)
+
+
+async def get_similar_answer(vector: List[float], lang: str, module: Optional[str]) -> Optional[Tuple[dict, float]]:
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return None
+    if settings.SEMANTIC_CACHE_SHARED:
+        try:
+            await _pull((lang or "", module or ""))
+        except Exception:
+            pass  # Redis unavailable: match against what this worker already has
+    return semantic_cache.lookup(vector, lang, module)
+
+
+async def set_similar_answer(vector: List[float], lang: str, module: Optional[str], answer: dict):
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return
+    if not settings.SEMANTIC_CACHE_SHARED:
+        semantic_cache.store(vector, lang, module, answer)
+        return
+    v = semantic_cache._normalize(vector)
+    if v is None:
+        return
+    scope = (lang or "", module or "")
+    member = json.dumps({"v": base64.b64encode(v.tobytes()).decode("ascii"), "value": answer,
+                         "exp": time.time() + semantic_cache.ttl})
+    try:
+        seq = await redis_service.redis_client.eval(
+            _PUBLISH, 2, SEQ_KEY, _scope_key(scope), member, semantic_cache.max_entries, semantic_cache.ttl)
+    except Exception:
+        seq = None  # Redis unavailable: keep the entry in this worker only
+    semantic_cache.store(vector, lang, module, answer, entry_id=int(seq) if seq is not None else None)
+
+
+def stats() -> dict:
+    return semantic_cache.stats()
@@ -0,0 +1,129 @@
+# core/services/single_flight.py
+"""
+Single-flight coalescing of identical in-flight questions.
+
+When the same uncached question arrives several times at once, only one caller
+(the leader) runs the embed/search/generate pipeline:
+- within a worker, followers await the leader's future
+- across workers, the leader holds a short Redis lock (SINGLE_FLIGHT_LOCK_TTL_MS) and
+  extends it every third of the TTL while it runs, so generations longer than the TTL
+  stay covered and a crashed leader's lock still expires quickly; callers that find it
+  taken poll the answer cache until the answer shows up, and run the pipeline
+  themselves if the lock goes away without one
+Keys are normalized like the Redis answer cache (redis_service.key_for_question).
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from core.services import redis_service
+from config.settings import settings
+
+_inflight: Dict[str, asyncio.Future] = {}
+_stats = {"leaders": 0, "followers": 0, "remote_waits": 0, "remote_hits": 0, "remote_fallbacks": 0}
+
+
+class _LeaderGone(Exception):
+    # the leader was cancelled (client went away); followers start over
+    pass
+
+
+async def do(
+    key: str,
+    fn: Callable[[], Awaitable[Any]],
+    check_cache: Callable[[], Awaitable[Optional[Any]]]
+) -> Any:
+    """
+    Return fn() for `key`, sharing one execution among concurrent callers.
+    check_cache() returns the answer once another worker has stored it, else None.
+    """
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return await fn()
+    local_key = redis_service.key_for_question(key)
+    while True:
+        fut = _inflight.get(local_key)
+        if fut is None:
+            break
+        _stats["followers"] += 1
+        try:
+            return await asyncio.shield(fut)
+        except _LeaderGone:
+            continue
+
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[local_key] = fut
+    _stats["leaders"] += 1
+    try:
+        result = await _lead(key, fn, check_cache)
+    except asyncio.CancelledError:
+        fut.set_exception(_LeaderGone())
+        raise
+    except BaseException as exc:
+        fut.set_exception(exc)
+        raise
+    else:
+        fut.set_result(result)
+        return result
+    finally:
+        _inflight.pop(local_key, None)
+        if fut.done() and not fut.cancelled():
+            # mark the exception as retrieved when nobody was waiting for it
+            fut.exception()
+
+
+async def _lead(key: str, fn, check_cache):
+    try:
+        token = await redis_service.acquire_question_lock(key, settings.SINGLE_FLIGHT_LOCK_TTL_MS)
+    except Exception:
+        # Redis unavailable: coalesce within this worker only
+        return await fn()
+    if token is None:
+        result = await _wait_for_remote(key, check_cache)
+        if result is not None:
+            return result
+        _stats["remote_fallbacks"] += 1
+        return await fn()
+    keep_alive = asyncio.create_task(_keep_alive(key, token))
+    try:
+        return await fn()
+    finally:
+        keep_alive.cancel()
+        try:
+            await redis_service.release_question_lock(key, token)
+        except Exception:
+            pass  # expires on its own after SINGLE_FLIGHT_LOCK_TTL_MS
+
+
+async def _keep_alive(key: str, token: str):
+    # extend the lock while the leader runs; stop once it was lost (expired and taken over)
+    ttl_ms = settings.SINGLE_FLIGHT_LOCK_TTL_MS
+    while True:
+        await asyncio.sleep(ttl_ms / 3000.0)
+        try:
+            if not await redis_service.extend_question_lock(key, token, ttl_ms):
+                return
+        except Exception:
+            pass  # Redis hiccup: try again next round, the lock is still valid for a while
+
+
+async def _wait_for_remote(key: str, check_cache) -> Optional[Any]:
+    # another worker is answering: poll the answer cache while its lock is held (it is
+    # extended while the leader runs), at most as long as a leader's generation can take
+    _stats["remote_waits"] += 1
+    poll = settings.SINGLE_FLIGHT_POLL_MS / 1000.0
+    deadline = time.monotonic() + settings.OLLAMA_QUEUE_TIMEOUT + settings.OLLAMA_TIMEOUT \
+        + settings.SINGLE_FLIGHT_LOCK_TTL_MS / 1000.0
+    while time.monotonic() < deadline:
+        await asyncio.sleep(poll)
+        result = await check_cache()
+        if result is not None:
+            _stats["remote_hits"] += 1
+            return result
+        if not await redis_service.question_locked(key):
+            # released (or expired) without a cached answer, e.g. the leader failed
+            return await check_cache()
+    return None
+
+
+def stats() -> dict:
+    return {"inflight": len(_inflight), **_stats}
@@ -0,0 +1,25 @@
+# core/services/vector_store.py
+"""
+Vector store selected by settings.VECTOR_BACKEND:
+- "qdrant" (default): core.services.qdrant_service, a remote Qdrant server
+- "local": core.services.local_vector_store, an in-process memory-mapped index
+Both backends expose the same async functions, re-exported here; the app calls
+these instead of importing a backend directly.
+"""
+from config.settings import settings
+
+if settings.VECTOR_BACKEND == "local":
+    from core.services import local_vector_store as backend
+elif settings.VECTOR_BACKEND == "qdrant":
+    from core.services import qdrant_service as backend
+else:
+    raise ValueError(f"Unknown VECTOR_BACKEND: {settings.VECTOR_BACKEND!r} (expected 'qdrant' or 'local')")
+
+aupsert = backend.aupsert
+adelete_by_module = backend.adelete_by_module
+afile_point_payloads = backend.afile_point_payloads
+adelete_points = backend.adelete_points
+aset_payloads = backend.aset_payloads
+asearch_vectors = backend.asearch_vectors
+asearch_vectors_batch = backend.asearch_vectors_batch
+aclose = backend.aclose
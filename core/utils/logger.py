@@ -1,32 +1,114 @@
 # core/utils/logger.py
+import asyncio
 import json, traceback
-from db.engine import get_conn
-from db.logs import init_logs_table
+from typing import Optional
+from db.logs import init_logs_table, insert_logs
+from config.settings import settings
+
+# In-process queue of pending log rows, drained in batches by a background task
+# (started/stopped from the app lifespan). Without a running writer (scripts),
+# log_action writes the row directly.
+_queue: Optional[asyncio.Queue] = None
+_writer: Optional[asyncio.Task] = None
+_table_ready = False
+_STOP = object()
 
 # Ensure logs table exists (call once before writing)
 async def ensure_logs_table():
+    global _table_ready
+    if _table_ready:
+        return
     # init_logs_table handles connection and IF NOT EXISTS
     await init_logs_table()
+    _table_ready = True
+
+async def _flush(rows: list):
+    try:
+        await insert_logs(rows)
+    except Exception as exc:
+        # Don't raise — log to stdout so the writer keeps running
+        print(f"logger: failed to write {len(rows)} log rows:", exc)
+        print(traceback.format_exc())
+
+async def _drain():
+    loop = asyncio.get_running_loop()
+    batch_size = max(1, settings.LOG_BATCH_SIZE)
+    interval = settings.LOG_FLUSH_INTERVAL_MS / 1000.0
+    stopping = False
+    while not stopping:
+        item = await _queue.get()
+        if item is _STOP:
+            break
+        rows = [item]
+        deadline = loop.time() + interval
+        # flush when the batch is full or the interval has passed
+        while len(rows) < batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is _STOP:
+                stopping = True
+                break
+            rows.append(item)
+        await _flush(rows)
+    # flush whatever is still queued behind the stop marker
+    rest = []
+    while not _queue.empty():
+        item = _queue.get_nowait()
+        if item is not _STOP:
+            rest.append(item)
+    if rest:
+        await _flush(rest)
+
+async def start_log_writer():
+    """
+    Create the logs table and start the background writer.
+    """
+    global _queue, _writer
+    await ensure_logs_table()
+    _queue = asyncio.Queue(maxsize=settings.LOG_QUEUE_MAX)
+    _writer = asyncio.create_task(_drain())
+
+async def stop_log_writer():
+    """
+    Flush pending rows and stop the background writer.
+    """
+    global _writer
+    if _writer is None:
+        return
+    await _queue.put(_STOP)
+    await _writer
+    _writer = None
 
 async def log_action(admin_id: str, action_type: str, details: dict):
     """
     Write an audit/log row. Defensive:
-      - ensures logs table exists
       - serializes details to JSON
+      - queues the row for the background writer (batched inserts), or writes it
+        directly if the writer isn't running or its queue is full
       - catches DB errors and prints them (so logging won't crash requests)
     """
     try:
+        row = (admin_id, action_type, json.dumps(details))
+        if _writer is not None and not _writer.done():
+            try:
+                _queue.put_nowait(row)
+                return
+            except asyncio.QueueFull:
+                pass
         await ensure_logs_table()
-        conn = await get_conn()
-        try:
-            await conn.execute(
-                "INSERT INTO logs (admin_id, action_type, details) VALUES (?, ?, ?)",
-                (admin_id, action_type, json.dumps(details))
-            )
-            await conn.commit()
-        finally:
-            await conn.close()
+        await insert_logs([row])
     except Exception as exc:
         # Don't raise — log to stdout so server keeps running
         print("logger.log_action error:", exc)
         print(traceback.format_exc())
+
+def stats() -> dict:
+    return {
+        "running": _writer is not None and not _writer.done(),
+        "queued": _queue.qsize() if _queue is not None else 0,
+    }
@@ -0,0 +1,193 @@
+# core/utils/metrics.py
+"""
+Minimal in-process metrics with Prometheus text exposition (GET /metrics).
+
+- Counter / Histogram with labels, recorded from the event loop (no locks needed)
+- stats metrics: existing stats() functions registered with register_stats(); every
+  numeric field is exported at scrape time as gauge rag_<name>_<field>, or as counter
+  rag_<name>_<field>_total for the fields listed as counters
+- timed(stage): context manager that observes rag_stage_duration_seconds{stage},
+  counts rag_stage_errors_total{stage} and adds the stage to the current request's
+  Server-Timing header (see start_request / server_timing_header)
+Recording is a perf_counter() pair plus a bisect per observation.
+"""
+import bisect
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in self._values.items()]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, ('le', _fmt_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(total[0])}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {cumulative}")
+        return lines
+
+
+_metrics: List = []
+_stats_sources: Dict[str, Tuple[Callable[[], dict], frozenset]] = {}
+
+
+def counter(name: str, help: str) -> Counter:
+    c = Counter(name, help)
+    _metrics.append(c)
+    return c
+
+
+def histogram(name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    h = Histogram(name, help, buckets)
+    _metrics.append(h)
+    return h
+
+
+def register_stats(name: str, fn: Callable[[], dict], counters: Tuple[str, ...] = ()):
+    """
+    Export the numeric fields of fn() (a module's stats()) as gauges rag_<name>_<field>.
+    Nested dicts are flattened with '_'.
+    - counters: fields that only ever grow (hits, passes, ...); they are exported as
+      counters rag_<name>_<field>_total so rate() and increase() work on them
+    """
+    _stats_sources[name] = (fn, frozenset(counters))
+
+
+# ---- shared metrics ----
+STAGE_SECONDS = histogram("rag_stage_duration_seconds", "Duration of pipeline stages.")
+STAGE_ERRORS = counter("rag_stage_errors_total", "Pipeline stages that raised.")
+HTTP_SECONDS = histogram("rag_http_request_duration_seconds", "HTTP request duration until response headers.")
+CACHE_REQUESTS = counter("rag_cache_requests_total", "Answer cache lookups by cache and result.")
+LLM_PROMPT_TOKENS = counter("rag_llm_prompt_tokens_total", "Prompt tokens processed by the LLM (as reported by Ollama).")
+LLM_COMPLETION_TOKENS = counter("rag_llm_completion_tokens_total", "Tokens generated by the LLM (as reported by Ollama).")
+INGEST_JOBS = counter("rag_ingest_jobs_total", "Finished ingestion jobs by status.")
+PROMPT_TOKENS = histogram("rag_prompt_tokens", "Prompt size in tokens as assembled.",
+                          buckets=(128, 256, 512, 1024, 2048, 3072, 4096, 8192))
+
+
+# ---- per-request Server-Timing ----
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request():
+    """Begin collecting stage timings for the current request (called by the HTTP middleware)."""
+    _request_timings.set([])
+
+
+def server_timing_header(total_ms: Optional[float] = None) -> Optional[str]:
+    timings = _request_timings.get()
+    if not timings and total_ms is None:
+        return None
+    parts = [f"{stage};dur={ms:.1f}" for stage, ms in timings or []]
+    if total_ms is not None:
+        parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
+
+
+def record_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds * 1000.0))
+
+
+@contextmanager
+def timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+# ---- exposition ----
+def _flatten(prefix: str, data: dict, out: List[Tuple[str, float]]):
+    for key, value in data.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            _flatten(name, value, out)
+        elif isinstance(value, bool):
+            out.append((name, 1.0 if value else 0.0))
+        elif isinstance(value, (int, float)):
+            out.append((name, float(value)))
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for source, (fn, counters) in _stats_sources.items():
+        try:
+            data = fn()
+        except Exception:
+            continue
+        values: List[Tuple[str, float]] = []
+        _flatten("", data, values)
+        for field, value in values:
+            field = field[1:]
+            kind = "counter" if field in counters else "gauge"
+            name = f"rag_{source}_{field}" + ("_total" if kind == "counter" else "")
+            name = "".join(ch if ch.isalnum() or ch == "_" else "_" for ch in name)
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {_fmt_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -1,9 +1,159 @@
 # db/engine.py
+import asyncio
+import time
 import aiosqlite
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator, List, Optional
+
+from config.settings import settings
 
 DB_PATH = Path("data/app.db")
 
-async def get_conn():
+# applied to every pooled connection; journal_mode=WAL lets readers run alongside the writer
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+async def _connect() -> aiosqlite.Connection:
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    return await aiosqlite.connect(DB_PATH)
\ No newline at end of file
+    conn = await aiosqlite.connect(DB_PATH)
+    for pragma in PRAGMAS:
+        await conn.execute(pragma)
+    return conn
+
+async def get_conn():
+    """
+    Open a standalone connection (caller closes it). Prefer read()/write(), which reuse pooled connections.
+    """
+    return await _connect()
+
+
+class ConnectionPool:
+    """
+    Long-lived aiosqlite connections: up to `size` reader connections plus one writer.
+    Writes are serialized through the single writer connection, which commits when the
+    write() block exits cleanly and rolls back otherwise.
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._idle: List[aiosqlite.Connection] = []
+        self._readers = 0
+        self._writer: Optional[aiosqlite.Connection] = None
+        # asyncio primitives belong to one event loop; recreated if the loop changes (scripts)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._read_slots: Optional[asyncio.Semaphore] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        # metrics
+        self.read_acquires = 0
+        self.write_acquires = 0
+        self.read_wait_total = 0.0
+        self.write_wait_total = 0.0
+        self.read_in_use = 0
+        self.write_waiting = 0
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._read_slots = asyncio.Semaphore(self.size)
+            self._write_lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        self._bind_loop()
+        started = time.perf_counter()
+        await self._read_slots.acquire()
+        self.read_wait_total += time.perf_counter() - started
+        self.read_acquires += 1
+        self.read_in_use += 1
+        conn = None
+        try:
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                conn = await _connect()
+                self._readers += 1
+            yield conn
+        finally:
+            if conn is not None:
+                if conn.in_transaction:
+                    await conn.rollback()
+                self._idle.append(conn)
+            self.read_in_use -= 1
+            self._read_slots.release()
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        self._bind_loop()
+        started = time.perf_counter()
+        self.write_waiting += 1
+        try:
+            await self._write_lock.acquire()
+        finally:
+            self.write_waiting -= 1
+        self.write_wait_total += time.perf_counter() - started
+        self.write_acquires += 1
+        try:
+            if self._writer is None:
+                self._writer = await _connect()
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            await self._writer.commit()
+        finally:
+            self._write_lock.release()
+
+    async def close(self):
+        conns = self._idle + ([self._writer] if self._writer is not None else [])
+        self._idle = []
+        self._writer = None
+        self._readers = 0
+        for conn in conns:
+            try:
+                await conn.close()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "readers_open": self._readers,
+            "readers_idle": len(self._idle),
+            "readers_in_use": self.read_in_use,
+            "writer_open": self._writer is not None,
+            "writers_waiting": self.write_waiting,
+            "read_acquires": self.read_acquires,
+            "write_acquires": self.write_acquires,
+            "avg_read_wait_ms": (self.read_wait_total / self.read_acquires * 1000.0) if self.read_acquires else 0.0,
+            "avg_write_wait_ms": (self.write_wait_total / self.write_acquires * 1000.0) if self.write_acquires else 0.0,
+        }
+
+
+_pool = ConnectionPool(settings.DB_POOL_SIZE)
+
+def read():
+    """
+    async with read() as conn: ...  -- a pooled read connection.
+    """
+    return _pool.reader()
+
+def write():
+    """
+    async with write() as conn: ...  -- the single writer connection; commits on exit.
+    """
+    return _pool.writer()
+
+async def close_pool():
+    await _pool.close()
+
+def stats() -> dict:
+    return _pool.stats()
@@ -0,0 +1,158 @@
+# db/jobs.py
+from db.engine import read, write
+from typing import List, Optional
+import json
+
+CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    module TEXT NOT NULL,
+    source_path TEXT NOT NULL,
+    lang TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    chunks_embedded INTEGER DEFAULT 0,
+    chunks_upserted INTEGER DEFAULT 0,
+    error TEXT,
+    result TEXT,
+    created_by TEXT,
+    owner TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+COLUMNS = ("job_id", "kind", "module", "source_path", "lang", "status", "chunks_embedded",
+           "chunks_upserted", "error", "result", "created_by", "owner", "created_at", "updated_at")
+
+# statuses a job can still move on from
+UNFINISHED = ("queued", "running")
+
+def _row_to_dict(row) -> dict:
+    job = dict(zip(COLUMNS, row))
+    if job.get("result"):
+        try:
+            job["result"] = json.loads(job["result"])
+        except Exception:
+            pass
+    return job
+
+async def init_jobs_table():
+    async with write() as conn:
+        await conn.execute(CREATE_SQL)
+        # tables created before job ownership existed lack the owner column
+        cur = await conn.execute("PRAGMA table_info(ingest_jobs)")
+        columns = {row[1] for row in await cur.fetchall()}
+        await cur.close()
+        if "owner" not in columns:
+            await conn.execute("ALTER TABLE ingest_jobs ADD COLUMN owner TEXT")
+
+async def create_job(job_id: str, kind: str, module: str, source_path: str, lang: Optional[str], created_by: Optional[str]):
+    async with write() as conn:
+        await conn.execute(
+            "INSERT INTO ingest_jobs (job_id, kind, module, source_path, lang, created_by) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, module, source_path, lang, created_by)
+        )
+
+async def get_job(job_id: str) -> Optional[dict]:
+    async with read() as conn:
+        cur = await conn.execute(f"SELECT {', '.join(COLUMNS)} FROM ingest_jobs WHERE job_id = ?", (job_id,))
+        row = await cur.fetchone()
+        await cur.close()
+    return _row_to_dict(row) if row else None
+
+async def list_jobs(limit: int = 100) -> List[dict]:
+    async with read() as conn:
+        cur = await conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM ingest_jobs ORDER BY created_at DESC, rowid DESC LIMIT ?",
+            (limit,)
+        )
+        rows = await cur.fetchall()
+        await cur.close()
+    return [_row_to_dict(r) for r in rows]
+
+async def list_unfinished_jobs() -> List[dict]:
+    """
+    Jobs that were queued or running, oldest first (used to resume after a restart).
+    """
+    async with read() as conn:
+        cur = await conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM ingest_jobs WHERE status IN (?, ?) ORDER BY created_at, rowid",
+            UNFINISHED
+        )
+        rows = await cur.fetchall()
+        await cur.close()
+    return [_row_to_dict(r) for r in rows]
+
+async def claim_job(job_id: str, owner: str) -> bool:
+    """
+    Atomically move a queued job to running for `owner`. False if it is no longer queued
+    (finished, cancelled, or claimed by another worker process).
+    """
+    async with write() as conn:
+        cur = await conn.execute(
+            "UPDATE ingest_jobs SET status = 'running', owner = ?, updated_at = CURRENT_TIMESTAMP "
+            "WHERE job_id = ? AND status = 'queued'",
+            (owner, job_id)
+        )
+        claimed = cur.rowcount == 1
+        await cur.close()
+    return claimed
+
+async def touch_jobs(owner: str, job_ids: List[str]):
+    """
+    Heartbeat: bump updated_at of the given running jobs of `owner` so they are not taken for abandoned.
+    """
+    if not job_ids:
+        return
+    async with write() as conn:
+        await conn.execute(
+            f"UPDATE ingest_jobs SET updated_at = CURRENT_TIMESTAMP "
+            f"WHERE status = 'running' AND owner = ? AND job_id IN ({', '.join('?' * len(job_ids))})",
+            (owner, *job_ids)
+        )
+
+async def release_jobs(owner: str) -> int:
+    """
+    Put the running jobs of `owner` back in the queue (clean shutdown). Returns the number released.
+    """
+    async with write() as conn:
+        cur = await conn.execute(
+            "UPDATE ingest_jobs SET status = 'queued', owner = NULL, chunks_embedded = 0, chunks_upserted = 0, "
+            "updated_at = CURRENT_TIMESTAMP WHERE status = 'running' AND owner = ?",
+            (owner,)
+        )
+        released = cur.rowcount
+        await cur.close()
+    return released
+
+async def requeue_stale_jobs(stale_after: int) -> int:
+    """
+    Put running jobs without a heartbeat for `stale_after` seconds back in the queue
+    (their worker process died). Returns the number requeued.
+    """
+    async with write() as conn:
+        cur = await conn.execute(
+            "UPDATE ingest_jobs SET status = 'queued', owner = NULL, chunks_embedded = 0, chunks_upserted = 0, "
+            "updated_at = CURRENT_TIMESTAMP WHERE status = 'running' AND updated_at < datetime('now', ?)",
+            (f"-{int(stale_after)} seconds",)
+        )
+        requeued = cur.rowcount
+        await cur.close()
+    return requeued
+
+async def update_job(job_id: str, **fields):
+    """
+    Update the given columns of a job, e.g. update_job(id, status="running").
+    """
+    if "result" in fields and fields["result"] is not None:
+        fields["result"] = json.dumps(fields["result"])
+    cols = [c for c in fields if c in COLUMNS and c != "job_id"]
+    if not cols:
+        return
+    assignments = ", ".join(f"{c} = ?" for c in cols)
+    async with write() as conn:
+        await conn.execute(
+            f"UPDATE ingest_jobs SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+            (*[fields[c] for c in cols], job_id)
+        )
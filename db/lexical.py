@@ -0,0 +1,93 @@
+# db/lexical.py
+from db.engine import read, write
+from typing import List, Optional, Sequence, Tuple
+import json
+
+# chunk rows (payload + filter columns) and an FTS5 index over their pre-tokenized text;
+# chunks_fts.rowid == chunks_lex.rowid
+CREATE_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS chunks_lex (
+        rowid INTEGER PRIMARY KEY,
+        point_id TEXT UNIQUE NOT NULL,
+        module TEXT,
+        lang TEXT,
+        filename TEXT,
+        payload TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS chunks_lex_module_lang ON chunks_lex (module, lang)",
+    "CREATE INDEX IF NOT EXISTS chunks_lex_module_file ON chunks_lex (module, filename)",
+    # tokens are produced by core.services.lexical_index.tokenize; keep '-', '.', '_' inside them
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+        tokens, tokenize="unicode61 remove_diacritics 0 tokenchars '-._'"
+    )
+    """,
+)
+
+async def init_lexical_tables():
+    async with write() as conn:
+        for sql in CREATE_SQL:
+            await conn.execute(sql)
+
+async def upsert_chunks(rows: Sequence[Tuple[str, dict, str]]):
+    """
+    Insert or replace chunks given as (point_id, payload, tokens) tuples.
+    """
+    if not rows:
+        return
+    async with write() as conn:
+        await _delete_ids(conn, [r[0] for r in rows])
+        for point_id, payload, tokens in rows:
+            cur = await conn.execute(
+                "INSERT INTO chunks_lex (point_id, module, lang, filename, payload) VALUES (?, ?, ?, ?, ?)",
+                (point_id, payload.get("module"), payload.get("lang"), payload.get("filename"), json.dumps(payload, ensure_ascii=False))
+            )
+            await conn.execute("INSERT INTO chunks_fts (rowid, tokens) VALUES (?, ?)", (cur.lastrowid, tokens))
+
+async def _delete_ids(conn, point_ids: List[str]):
+    for i in range(0, len(point_ids), 500):
+        part = point_ids[i:i + 500]
+        marks = ",".join("?" * len(part))
+        await conn.execute(f"DELETE FROM chunks_fts WHERE rowid IN (SELECT rowid FROM chunks_lex WHERE point_id IN ({marks}))", part)
+        await conn.execute(f"DELETE FROM chunks_lex WHERE point_id IN ({marks})", part)
+
+async def delete_chunks(point_ids: List[str]):
+    if not point_ids:
+        return
+    async with write() as conn:
+        await _delete_ids(conn, point_ids)
+
+async def delete_module(module: str):
+    async with write() as conn:
+        await conn.execute("DELETE FROM chunks_fts WHERE rowid IN (SELECT rowid FROM chunks_lex WHERE module = ?)", (module,))
+        await conn.execute("DELETE FROM chunks_lex WHERE module = ?", (module,))
+
+async def search(match: str, limit: int, module: Optional[str] = None, lang: Optional[str] = None) -> List[Tuple[str, dict, float]]:
+    """
+    BM25-ranked full-text search. Returns (point_id, payload, bm25) rows, best first
+    (SQLite's bm25() is lower-is-better).
+    """
+    where = ["chunks_fts MATCH ?"]
+    params: list = [match]
+    if module:
+        where.append("l.module = ?")
+        params.append(module)
+    if lang:
+        where.append("l.lang = ?")
+        params.append(lang)
+    params.append(limit)
+    async with read() as conn:
+        cur = await conn.execute(
+            f"""
+            SELECT l.point_id, l.payload, bm25(chunks_fts) AS score
+            FROM chunks_fts JOIN chunks_lex l ON l.rowid = chunks_fts.rowid
+            WHERE {' AND '.join(where)}
+            ORDER BY score LIMIT ?
+            """,
+            params
+        )
+        rows = await cur.fetchall()
+        await cur.close()
+    return [(r[0], json.loads(r[1]), r[2]) for r in rows]
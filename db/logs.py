@@ -1,6 +1,6 @@
 # db/logs.py
-from db.engine import get_conn
-from typing import Optional
+from db.engine import read, write
+from typing import List, Optional, Tuple
 
 CREATE_SQL = """
 CREATE TABLE IF NOT EXISTS logs (
@@ -13,34 +13,33 @@ CREATE TABLE IF NOT EXISTS logs (
 """
 
 async def init_logs_table():
-    conn = await get_conn()
-    try:
+    async with write() as conn:
         await conn.execute(CREATE_SQL)
-        await conn.commit()
-    finally:
-        await conn.close()
 
 async def insert_log(admin_id: Optional[str], action_type: str, details: str):
-    conn = await get_conn()
-    try:
+    async with write() as conn:
         await conn.execute(
             "INSERT INTO logs (admin_id, action_type, details) VALUES (?, ?, ?)",
             (admin_id, action_type, details)
         )
-        await conn.commit()
-    finally:
-        await conn.close()
+
+async def insert_logs(rows: List[Tuple[Optional[str], str, str]]):
+    """
+    Insert many (admin_id, action_type, details) rows with a single commit.
+    """
+    async with write() as conn:
+        await conn.executemany(
+            "INSERT INTO logs (admin_id, action_type, details) VALUES (?, ?, ?)",
+            rows
+        )
 
 async def get_recent_logs(limit: int = 100):
-    conn = await get_conn()
-    try:
+    async with read() as conn:
         cur = await conn.execute(
             "SELECT log_id, admin_id, action_type, details, timestamp FROM logs ORDER BY log_id DESC LIMIT ?",
             (limit,)
         )
         rows = await cur.fetchall()
-    finally:
-        await conn.close()
     return rows
 
 
@@ -1,7 +1,8 @@
 # db/users.py
 from typing import Optional
-from db.engine import get_conn
-from auth.password import hash_password, verify_password
+from db.engine import read, write
+from auth.password import hash_password_async, verify_password_async
+from auth.sessions import delete_user_sessions
 
 CREATE_USERS_SQL = """
 CREATE TABLE IF NOT EXISTS users (
@@ -14,51 +15,37 @@ CREATE TABLE IF NOT EXISTS users (
 """
 
 async def init_users_table():
-    conn = await get_conn()
-    try:
+    async with write() as conn:
         await conn.execute(CREATE_USERS_SQL)
-        await conn.commit()
-    finally:
-        await conn.close()
 
 async def create_user(user_id: str, username: str, password: str, role: str = "user"):
-    pwd = hash_password(password)
-    conn = await get_conn()
-    try:
+    pwd = await hash_password_async(password)
+    async with write() as conn:
         await conn.execute(
             "INSERT INTO users (user_id, username, password_hash, role) VALUES (?, ?, ?, ?)",
             (user_id, username, pwd, role)
         )
-        await conn.commit()
-    finally:
-        await conn.close()
 
 async def get_user_by_username(username: str) -> Optional[dict]:
-    conn = await get_conn()
-    try:
+    async with read() as conn:
         cur = await conn.execute(
             "SELECT user_id, username, password_hash, role FROM users WHERE username = ?",
             (username,)
         )
         row = await cur.fetchone()
         await cur.close()
-    finally:
-        await conn.close()
     if not row:
         return None
     return {"user_id": row[0], "username": row[1], "password_hash": row[2], "role": row[3]}
 
 async def get_user_by_id(user_id: str) -> Optional[dict]:
-    conn = await get_conn()
-    try:
+    async with read() as conn:
         cur = await conn.execute(
             "SELECT user_id, username, password_hash, role FROM users WHERE user_id = ?",
             (user_id,)
         )
         row = await cur.fetchone()
         await cur.close()
-    finally:
-        await conn.close()
     if not row:
         return None
     return {"user_id": row[0], "username": row[1], "password_hash": row[2], "role": row[3]}
@@ -67,19 +54,19 @@ async def authenticate(username: str, password: str) -> Optional[dict]:
     user = await get_user_by_username(username)
     if not user:
         return None
-    if not verify_password(password, user["password_hash"]):
+    if not await verify_password_async(password, user["password_hash"]):
         return None
     # Return user excluding password hash
     return {"user_id": user["user_id"], "username": user["username"], "role": user["role"]}
 
 async def update_password(user_id: str, new_password: str):
-    new_hash = hash_password(new_password)
-    conn = await get_conn()
-    try:
+    """
+    Set a new password and revoke the user's existing sessions (and their cached user rows).
+    """
+    new_hash = await hash_password_async(new_password)
+    async with write() as conn:
         await conn.execute(
             "UPDATE users SET password_hash = ? WHERE user_id = ?",
             (new_hash, user_id)
         )
-        await conn.commit()
-    finally:
-        await conn.close()
+    await delete_user_sessions(user_id)
@@ -1,18 +1,41 @@
 # ingestion/ingest.py
 import uuid
+import hashlib
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Callable
 import asyncio
 import math
 import re
+import time
 
-from core.services.qdrant_service import upsert as upsert_points
+from core.services.vector_store import aupsert as upsert_points, afile_point_payloads, aset_payloads, adelete_points
 from core.services.embedder import embed_texts
+from core.services import lexical_index
+from core.utils import metrics
+from core.utils.metrics import timed
+from ingestion.parse.txt_parser import iter_txt_blocks
+from ingestion.parse.pdf_parser import iter_pdf_pages
 from config.settings import settings
 
 # -----------------------
 # Text extraction helpers
 # -----------------------
+def iter_text_pages(filepath: Path) -> Iterator[str]:
+    """
+    Yield the text of a supported file piece by piece, so large files are never
+    held in memory as one string.
+    - .txt : blocks of whole lines
+    - .pdf : one page at a time (pypdf, sharded across a process pool)
+    Yields nothing if unsupported. Extraction errors (unreadable file, pypdf missing,
+    a crashed worker pool) are raised, also partway through the file, so a partial
+    extraction is never mistaken for a shorter document.
+    """
+    suffix = filepath.suffix.lower()
+    if suffix == ".txt":
+        yield from iter_txt_blocks(filepath)
+    elif suffix == ".pdf":
+        yield from iter_pdf_pages(filepath)
+
 def extract_text_from_file(filepath: Path) -> str:
     """
     Extract text from supported files.
@@ -21,28 +44,9 @@ def extract_text_from_file(filepath: Path) -> str:
     Returns empty string if unsupported or extraction fails.
     """
     try:
-        suffix = filepath.suffix.lower()
-        if suffix == ".txt":
-            return filepath.read_text(encoding="utf-8", errors="ignore")
-        if suffix == ".pdf":
-            try:
-                from pypdf import PdfReader
-            except Exception:
-                # pypdf not installed or failed import
-                return ""
-            try:
-                reader = PdfReader(str(filepath))
-                out = []
-                for page in reader.pages:
-                    text = page.extract_text()
-                    if text:
-                        out.append(text)
-                return "\n".join(out)
-            except Exception:
-                return ""
+        return "\n".join(iter_text_pages(filepath))
     except Exception:
         return ""
-    return ""
 
 # -----------------------
 # Chunking helper
@@ -74,56 +78,221 @@ def chunk_text(text: str, max_words: int = 250, overlap: int = 50) -> List[str]:
         i += (max_words - overlap)
     return chunks
 
+def iter_chunks(pieces: Iterable[str], max_words: int = 250, overlap: int = 50) -> Iterator[str]:
+    """
+    Incremental version of chunk_text over a stream of text pieces (e.g. pages).
+    Produces the same chunks as chunk_text("\\n".join(pieces)) while only buffering
+    about one chunk worth of words.
+    """
+    step = max_words - overlap
+    buf: List[str] = []
+    for piece in pieces:
+        buf.extend(piece.split())
+        # only emit once we know more words follow, so the final chunk matches chunk_text
+        while len(buf) > max_words:
+            yield " ".join(buf[:max_words])
+            del buf[:step]
+    if buf:
+        yield " ".join(buf)
+
 # -----------------------
-# Ingest function
+# Point ids
 # -----------------------
-async def ingest_file(module: str, filepath: Path, lang: str = "ja") -> Dict[str, Any]:
+# fixed namespace so the same chunk of the same file always maps to the same point id
+POINT_ID_NAMESPACE = uuid.UUID("5b0c7f64-3d0e-4a55-9a63-6f1f2f8f4a71")
+
+# payload fields that can change without the chunk text changing
+_MUTABLE_FIELDS = ("source_path", "lang", "chunk_index")
+
+def chunk_point_id(module: str, filename: str, chunk: str) -> str:
+    """
+    Deterministic point id: uuid5 over module/filename/sha256(chunk text).
+    Re-ingesting an unchanged chunk therefore hits the same point.
     """
-    Ingest a file into Qdrant (collection from settings).
+    digest = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{module}/{filename}/{digest}"))
+
+# -----------------------
+# Ingest pipeline
+# -----------------------
+_DONE = object()
+
+class _UpsertFailed(Exception):
+    pass
+
+async def _next_in_thread(it: Iterator):
+    # pull the next item of a blocking iterator without blocking the event loop
+    return await asyncio.to_thread(next, it, _DONE)
+
+async def _report(progress: Optional[Callable[[dict], Any]], info: dict):
+    if progress is None:
+        return
+    res = progress(info)
+    if asyncio.iscoroutine(res):
+        await res
+
+async def ingest_file(
+    module: str,
+    filepath: Path,
+    lang: str = "ja",
+    progress: Optional[Callable[[dict], Any]] = None
+) -> Dict[str, Any]:
+    """
+    Ingest (or re-ingest) a file into the vector store (collection from settings).
+    Runs as a streaming pipeline with bounded queues between stages, so memory stays
+    flat regardless of document size:
+      1) extract + chunk  (page by page, in a worker thread)
+      2) embed            (INGEST_EMBED_BATCH chunks per encode)
+      3) upsert           (INGEST_UPSERT_BATCH points per request, also indexed for BM25)
+    Point ids are deterministic (chunk_point_id), so on re-ingest only new or changed
+    chunks are embedded and upserted, unchanged chunks only get their payload fixed up
+    if needed, and points of the previous version that no longer exist are deleted.
+    Stale points are only deleted after the whole file was extracted: an extraction error
+    is raised (the job fails) and leaves the previous version's points in place.
+    `progress` (sync or async callable) is called after every upsert batch with
+    {"chunks_embedded", "chunks_upserted", "chunks_unchanged", "batches"}.
     Returns metadata dict for admin UI.
     """
-    # 1) extract text
-    text = extract_text_from_file(filepath)
-    if not text:
-        return {"ok": False, "reason": "no_text_extracted", "module": module, "filename": filepath.name}
-
-    # 2) chunk text
-    # Choose chunk size sensible for your model; 250 words ~ ~200 tokens depending on language.
-    chunks = chunk_text(text, max_words=250, overlap=50)
-    if not chunks:
-        return {"ok": False, "reason": "no_chunks", "module": module, "filename": filepath.name}
-
-    # 3) embed chunks (async wrapper around sentence-transformers)
-    vectors = await embed_texts(chunks)  # List[List[float]]
-
-    # 4) assemble points
-    points = []
-    for idx, (chunk, vec) in enumerate(zip(chunks, vectors)):
-        point_id = str(uuid.uuid4())
-        payload = {
-            "module": module,
-            "filename": filepath.name,
-            "source_path": str(filepath),
-            "lang": lang,
-            "chunk_index": idx,
-            "text": chunk
-        }
-        points.append({
-            "id": point_id,
-            "vector": vec,
-            "payload": payload
-        })
-
-    # 5) upsert into Qdrant — run in thread because qdrant client is blocking
+    collection = settings.QDRANT_COLLECTION
+    embed_batch = max(1, settings.INGEST_EMBED_BATCH)
+    upsert_batch = max(1, settings.INGEST_UPSERT_BATCH)
+    chunk_q: asyncio.Queue = asyncio.Queue(maxsize=settings.INGEST_QUEUE_DEPTH)
+    point_q: asyncio.Queue = asyncio.Queue(maxsize=settings.INGEST_QUEUE_DEPTH)
+    counters = {"chunks_embedded": 0, "chunks_upserted": 0, "chunks_unchanged": 0, "batches": 0}
+
+    # 0) points of the previous version of this file: {id: mutable payload fields}
+    existing = await afile_point_payloads(collection, module, filepath.name, _MUTABLE_FIELDS)
+    seen: set = set()
+    # set once the extractor is exhausted without error; stale deletion depends on it
+    extracted = False
+
+    # 1) extract text and chunk it, handing off fixed-size batches of (id, payload)
+    async def produce():
+        nonlocal extracted
+        # Choose chunk size sensible for your model; 250 words ~ ~200 tokens depending on language.
+        it = iter_chunks(iter_text_pages(filepath), max_words=250, overlap=50)
+        batch = []
+        idx = 0
+        extract_seconds = 0.0
+        while True:
+            started = time.perf_counter()
+            chunk = await _next_in_thread(it)
+            extract_seconds += time.perf_counter() - started
+            if chunk is _DONE:
+                extracted = True
+                break
+            point_id = chunk_point_id(module, filepath.name, chunk)
+            if point_id not in seen:
+                # identical chunks within one file share an id; keep the first occurrence
+                seen.add(point_id)
+                payload = {
+                    "module": module,
+                    "filename": filepath.name,
+                    "source_path": str(filepath),
+                    "lang": lang,
+                    "chunk_index": idx,
+                    "text": chunk
+                }
+                batch.append((point_id, payload))
+            idx += 1
+            if len(batch) >= embed_batch:
+                # extraction time per handed-off batch (excludes waiting on the queue)
+                metrics.record_stage("ingest_extract", extract_seconds)
+                extract_seconds = 0.0
+                await chunk_q.put(batch)
+                batch = []
+        metrics.record_stage("ingest_extract", extract_seconds)
+        if batch:
+            await chunk_q.put(batch)
+        await chunk_q.put(None)
+
+    # 2) embed new/changed chunks (async wrapper around sentence-transformers) and assemble points
+    async def embed():
+        while True:
+            batch = await chunk_q.get()
+            if batch is None:
+                break
+            new_items = []
+            unchanged = []
+            payload_updates = {}
+            for point_id, payload in batch:
+                old = existing.get(point_id)
+                if old is None:
+                    new_items.append((point_id, payload))
+                    continue
+                counters["chunks_unchanged"] += 1
+                unchanged.append({"id": point_id, "payload": payload})
+                changed = {f: payload[f] for f in _MUTABLE_FIELDS if old.get(f) != payload[f]}
+                if changed:
+                    payload_updates[point_id] = changed
+            if payload_updates:
+                await aset_payloads(collection, payload_updates)
+            if unchanged:
+                # no embedding needed, but (re)index the text so the lexical index follows the file
+                await lexical_index.index_points(unchanged)
+            if not new_items:
+                continue
+            with timed("ingest_embed"):
+                vectors = await embed_texts([p["text"] for _, p in new_items], use_cache=True)  # List[List[float]]
+            points = [{"id": pid, "vector": vec, "payload": payload} for (pid, payload), vec in zip(new_items, vectors)]
+            counters["chunks_embedded"] += len(points)
+            await point_q.put(points)
+        await point_q.put(None)
+
+    # 3) upsert into the vector store in fixed-size batches
+    async def upsert():
+        pending = []
+        while True:
+            points = await point_q.get()
+            if points is not None:
+                pending.extend(points)
+            while len(pending) >= upsert_batch or (points is None and pending):
+                batch, pending = pending[:upsert_batch], pending[upsert_batch:]
+                try:
+                    with timed("ingest_upsert"):
+                        await upsert_points(collection, batch)
+                except Exception as exc:
+                    raise _UpsertFailed(exc) from exc
+                with timed("ingest_lexical"):
+                    await lexical_index.index_points(batch)
+                counters["chunks_upserted"] += len(batch)
+                counters["batches"] += 1
+                await _report(progress, dict(counters))
+            if points is None:
+                break
+
+    tasks = [asyncio.create_task(produce()), asyncio.create_task(embed()), asyncio.create_task(upsert())]
     try:
-        await asyncio.to_thread(upsert_points, settings.QDRANT_COLLECTION, points)
-    except Exception as exc:
-        return {"ok": False, "reason": f"qdrant_upsert_failed: {exc}", "module": module, "filename": filepath.name}
+        await asyncio.gather(*tasks)
+    except BaseException as exc:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if not isinstance(exc, _UpsertFailed):
+            raise
+        # points of batches already upserted stay in the collection; stale points are kept
+        return {"ok": False, "reason": f"qdrant_upsert_failed: {exc}", "module": module, "filename": filepath.name, **counters}
+
+    # 4) drop points of the previous version that are no longer part of the file
+    #    (all of them when the new version yields no text, so they don't stay searchable);
+    #    only a complete extraction tells which points are gone, a failed one raised above
+    stale = [pid for pid in existing if pid not in seen] if extracted else []
+    if stale:
+        with timed("ingest_delete_stale"):
+            await adelete_points(collection, stale)
+            await lexical_index.delete_points(stale)
+
+    if not seen:
+        return {"ok": False, "reason": "no_text_extracted", "module": module, "filename": filepath.name, "deleted": len(stale)}
 
-    # 6) return metadata
+    # return metadata
     return {
         "ok": True,
-        "chunks": len(chunks),
+        "chunks": len(seen),
+        "embedded": counters["chunks_embedded"],
+        "unchanged": counters["chunks_unchanged"],
+        "deleted": len(stale),
+        "batches": counters["batches"],
         "module": module,
         "filename": filepath.name,
         "lang": lang
@@ -0,0 +1,218 @@
+# ingestion/jobs.py
+"""
+Background ingestion jobs.
+
+Admin uploads/re-ingests create a row in the ingest_jobs table and return right
+away; a small pool of worker tasks (INGEST_WORKERS) runs ingest_file for queued
+jobs and records progress, result or error on the row.
+
+Several processes (uvicorn workers) can share the table:
+- a worker claims a job atomically (queued -> running, owner = this process), so
+  each job runs once even if more than one process has it in its local queue
+- running jobs get a heartbeat every INGEST_JOB_HEARTBEAT seconds; jobs without one
+  for INGEST_JOB_STALE_AFTER seconds (their process died) are queued again
+- on a clean stop() a process puts its running jobs back in the queue
+"""
+import asyncio
+import os
+import socket
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+import db.jobs as jobs_db
+from core.utils import logger as event_logger
+from ingestion.ingest import ingest_file
+from core.utils import metrics
+from config.settings import settings
+
+# audit log action per job kind: (success, failure)
+_LOG_ACTIONS = {
+    "upload": ("UPLOAD_INGEST", "UPLOAD_INGEST_FAILED"),
+    "reingest": ("REINGEST_FILE", "REINGEST_FAILED"),
+}
+
+# identifies this process as the owner of the jobs it runs
+_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_queue: Optional[asyncio.Queue] = None
+# job ids currently in _queue, so the periodic sweep does not queue them twice
+_enqueued: set = set()
+_workers: list = []
+_monitor: Optional[asyncio.Task] = None
+_running: Dict[str, asyncio.Task] = {}
+# job ids whose cancellation came from cancel() rather than from stop()
+_cancel_requested: set = set()
+
+
+def _enqueue(job_id: str):
+    if job_id not in _enqueued:
+        _enqueued.add(job_id)
+        _queue.put_nowait(job_id)
+
+
+async def _enqueue_unclaimed():
+    # abandoned running jobs go back to queued; queued jobs of any process are offered to our workers
+    await jobs_db.requeue_stale_jobs(settings.INGEST_JOB_STALE_AFTER)
+    for job in await jobs_db.list_unfinished_jobs():
+        if job["status"] == "queued":
+            _enqueue(job["job_id"])
+
+
+async def start():
+    """
+    Create the jobs table, queue unclaimed jobs and start the worker pool and the heartbeat.
+    Jobs running in other live processes are left alone.
+    """
+    global _queue, _workers, _monitor
+    await jobs_db.init_jobs_table()
+    _queue = asyncio.Queue()
+    _enqueued.clear()
+    await _enqueue_unclaimed()
+    _workers = [asyncio.create_task(_worker()) for _ in range(max(1, settings.INGEST_WORKERS))]
+    _monitor = asyncio.create_task(_heartbeat())
+
+
+async def stop():
+    """
+    Stop the workers and put the jobs they were running back in the queue for the next start()
+    (of this or another process).
+    """
+    global _monitor
+    tasks = _workers + ([_monitor] if _monitor is not None else [])
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _workers.clear()
+    _monitor = None
+    try:
+        await jobs_db.release_jobs(_OWNER)
+    except Exception as e:
+        # left 'running'; requeued once their heartbeat is stale
+        print("failed to release ingestion jobs:", e)
+
+
+async def submit(kind: str, module: str, source_path: Path, lang: str, created_by: Optional[str]) -> dict:
+    """
+    Record a new job and queue it. Returns the job row.
+    """
+    job_id = uuid.uuid4().hex
+    await jobs_db.create_job(job_id, kind, module, str(source_path), lang, created_by)
+    _enqueue(job_id)
+    return await jobs_db.get_job(job_id)
+
+
+async def cancel(job_id: str) -> Optional[dict]:
+    """
+    Cancel a queued or running job. Returns the updated job row, or None if unknown.
+    """
+    job = await jobs_db.get_job(job_id)
+    if not job:
+        return None
+    if job["status"] not in jobs_db.UNFINISHED:
+        return job
+    task = _running.get(job_id)
+    if task is not None:
+        # running in this process: the job task records the cancellation once it unwinds
+        _cancel_requested.add(job_id)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    else:
+        # queued: the claim fails when it is dequeued; running in another process:
+        # its heartbeat sees the status and cancels the task
+        await jobs_db.update_job(job_id, status="cancelled")
+    return await jobs_db.get_job(job_id)
+
+
+def stats() -> dict:
+    return {
+        "workers": len(_workers),
+        "queued": _queue.qsize() if _queue is not None else 0,
+        "running": len(_running),
+    }
+
+
+async def _heartbeat():
+    while True:
+        await asyncio.sleep(max(1, settings.INGEST_JOB_HEARTBEAT))
+        try:
+            running = list(_running)
+            await jobs_db.touch_jobs(_OWNER, running)
+            for job_id in running:
+                # cancelled through another process
+                job = await jobs_db.get_job(job_id)
+                task = _running.get(job_id)
+                if job and job["status"] == "cancelled" and task is not None:
+                    _cancel_requested.add(job_id)
+                    task.cancel()
+            await _enqueue_unclaimed()
+        except Exception as e:
+            print("ingestion job heartbeat failed:", e)
+
+
+async def _worker():
+    while True:
+        job_id = await _queue.get()
+        _enqueued.discard(job_id)
+        try:
+            await _process(job_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # keep draining the queue; a job left 'running' is requeued once its heartbeat is stale
+            print(f"ingestion job {job_id} failed:", e)
+
+
+async def _process(job_id: str):
+    if not await jobs_db.claim_job(job_id, _OWNER):
+        # finished, cancelled or claimed by another process
+        return
+    job = await jobs_db.get_job(job_id)
+    task = asyncio.create_task(_run(job))
+    _running[job_id] = task
+    try:
+        await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if not task.done():
+            # the worker itself is being stopped; stop() puts the job back in the queue
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            raise
+        # the job alone was cancelled (cancel()); keep the worker running
+    finally:
+        _running.pop(job_id, None)
+
+
+async def _run(job: dict):
+    job_id = job["job_id"]
+    ok_action, failed_action = _LOG_ACTIONS.get(job["kind"], ("INGEST_JOB", "INGEST_JOB_FAILED"))
+    source_path = Path(job["source_path"])
+    details = {"module": job["module"], "file": source_path.name, "lang": job["lang"], "job_id": job_id}
+
+    async def progress(info: dict):
+        await jobs_db.update_job(job_id, chunks_embedded=info["chunks_embedded"], chunks_upserted=info["chunks_upserted"])
+
+    try:
+        with metrics.timed("ingest_file"):
+            meta = await ingest_file(job["module"], source_path, lang=job["lang"] or "ja", progress=progress)
+    except asyncio.CancelledError:
+        metrics.INGEST_JOBS.inc(status="cancelled")
+        if job_id in _cancel_requested:
+            _cancel_requested.discard(job_id)
+            await jobs_db.update_job(job_id, status="cancelled")
+            await event_logger.log_action(job["created_by"], "INGEST_JOB_CANCELLED", details)
+        raise
+    except Exception as exc:
+        metrics.INGEST_JOBS.inc(status="failed")
+        await jobs_db.update_job(job_id, status="failed", error=str(exc))
+        await event_logger.log_action(job["created_by"], failed_action, {**details, "error": str(exc)})
+        return
+
+    metrics.INGEST_JOBS.inc(status="done" if meta.get("ok") else "failed")
+    if not meta.get("ok"):
+        await jobs_db.update_job(job_id, status="failed", error=meta.get("reason"), result=meta)
+        await event_logger.log_action(job["created_by"], failed_action, {**details, "meta": meta})
+        return
+    await jobs_db.update_job(job_id, status="done", result=meta,
+                             chunks_embedded=meta.get("embedded", 0), chunks_upserted=meta.get("embedded", 0))
+    await event_logger.log_action(job["created_by"], ok_action, {**details, "meta": meta})
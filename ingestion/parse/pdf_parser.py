@@ -0,0 +1,108 @@
+# ingestion/parse/pdf_parser.py
+"""
+PDF text extraction sharded across a process pool.
+
+pypdf is pure Python and CPU-bound, so pages are split into ranges of
+PDF_PAGES_PER_SHARD pages and extracted in PDF_WORKERS processes; the shards are
+yielded back in page order.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from config.settings import settings
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            # spawn, not fork: forking this multi-threaded server (torch, DB pool, log writer
+            # threads) can leave locks held in the children; spawned workers only import this module
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool():
+    """
+    Stop the worker processes (called on app shutdown).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    # a pool whose worker died is unusable; the next call to _get_pool starts a new one
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _extract_range(path: str, start: int, end: int) -> List[str]:
+    # runs in a worker process: open the file there and extract pages [start, end)
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    out = []
+    for i in range(start, end):
+        try:
+            out.append(reader.pages[i].extract_text() or "")
+        except Exception:
+            out.append("")
+    return out
+
+
+def iter_pdf_pages(filepath: Path, workers: Optional[int] = None, pages_per_shard: Optional[int] = None) -> Iterator[str]:
+    """
+    Yield the text of each non-empty page, in page order.
+    Small PDFs (or workers <= 1) are extracted in-process.
+    Raises if the file can't be read or a worker process dies (BrokenProcessPool).
+    """
+    from pypdf import PdfReader
+
+    workers = workers or settings.PDF_WORKERS
+    shard = max(1, pages_per_shard or settings.PDF_PAGES_PER_SHARD)
+    path = str(filepath)
+    n_pages = len(PdfReader(path).pages)
+
+    if workers <= 1 or n_pages <= shard:
+        for text in _extract_range(path, 0, n_pages):
+            if text:
+                yield text
+        return
+
+    pool = _get_pool(workers)
+    ranges = deque((s, min(s + shard, n_pages)) for s in range(0, n_pages, shard))
+    # keep a bounded window of shards in flight so memory doesn't grow with page count
+    in_flight: deque = deque()
+    try:
+        while ranges or in_flight:
+            while ranges and len(in_flight) < workers * 2:
+                start, end = ranges.popleft()
+                in_flight.append(pool.submit(_extract_range, path, start, end))
+            fut: Future = in_flight.popleft()
+            for text in fut.result():
+                if text:
+                    yield text
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        # consumer stopped early (error/cancel): drop shards not started yet
+        for fut in in_flight:
+            fut.cancel()
@@ -0,0 +1,21 @@
+# ingestion/parse/txt_parser.py
+from pathlib import Path
+from typing import Iterator
+
+# .txt files are yielded in blocks of lines of roughly this many characters
+TXT_BLOCK_CHARS = 64 * 1024
+
+def iter_txt_blocks(filepath: Path, block_chars: int = TXT_BLOCK_CHARS) -> Iterator[str]:
+    """
+    Yield a text file in blocks of whole lines, so it is never read as one string.
+    """
+    with filepath.open("r", encoding="utf-8", errors="ignore") as f:
+        block, size = [], 0
+        for line in f:
+            block.append(line)
+            size += len(line)
+            if size >= block_chars:
+                yield "".join(block)
+                block, size = [], 0
+        if block:
+            yield "".join(block)
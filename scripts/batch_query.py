@@ -0,0 +1,90 @@
+# scripts/batch_query.py
+"""
+Run a file of questions through /api/chat/batch and write the answers as JSON lines.
+
+Input: one question per line, or JSON lines with {"text", "lang"?, "module"?}.
+
+  python scripts/batch_query.py questions.txt -o answers.jsonl --module billing
+  python scripts/batch_query.py faq.jsonl --url http://127.0.0.1:8000 --no-cache
+
+Logs in as an admin (--username/--password or BATCH_USERNAME/BATCH_PASSWORD).
+Output lines are in input order; the summary goes to stderr.
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import httpx
+
+
+def read_queries(path: Path, lang: str, module: str) -> list:
+    queries = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            item = json.loads(line)
+        else:
+            item = {"text": line}
+        item.setdefault("lang", lang)
+        if module and not item.get("module"):
+            item["module"] = module
+        queries.append(item)
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions via /api/chat/batch.")
+    parser.add_argument("input", type=Path, help="questions (.txt, one per line, or .jsonl)")
+    parser.add_argument("-o", "--out", type=Path, default=None, help="output .jsonl (default: stdout)")
+    parser.add_argument("--url", default=os.getenv("BATCH_URL", "http://127.0.0.1:8000"))
+    parser.add_argument("--username", default=os.getenv("BATCH_USERNAME", "admin"))
+    parser.add_argument("--password", default=os.getenv("BATCH_PASSWORD"))
+    parser.add_argument("--lang", default="ja", help="default lang for plain-text lines")
+    parser.add_argument("--module", default=None, help="default module filter")
+    parser.add_argument("--concurrency", type=int, default=None, help="parallel generations on the server")
+    parser.add_argument("--no-cache", action="store_true", help="ignore cached answers")
+    args = parser.parse_args()
+
+    if not args.password:
+        parser.error("--password (or BATCH_PASSWORD) is required")
+    queries = read_queries(args.input, args.lang, args.module)
+    if not queries:
+        parser.error("no questions in input")
+
+    results = [None] * len(queries)
+    summary = {}
+    with httpx.Client(base_url=args.url.rstrip("/"), timeout=None) as client:
+        r = client.post("/api/auth/login", json={"username": args.username, "password": args.password})
+        r.raise_for_status()
+        body = {"queries": queries, "concurrency": args.concurrency, "use_cache": not args.no_cache}
+        with client.stream("POST", "/api/chat/batch", json=body) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if item.get("done"):
+                    summary = item
+                elif "index" in item:
+                    results[item["index"]] = item
+                    print(f"[{sum(x is not None for x in results)}/{len(queries)}] {item['text'][:60]}", file=sys.stderr)
+                else:
+                    print("batch error:", item.get("error"), file=sys.stderr)
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        for item in results:
+            if item is not None:
+                out.write(json.dumps(item, ensure_ascii=False) + "\n")
+    finally:
+        if args.out:
+            out.close()
+    print("summary:", json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+# scripts/benchmark.py
+"""
+End-to-end load/latency benchmark of the chat API, fully offline.
+
+Drives app.app in-process (httpx ASGITransport) against local stand-ins:
+- vector store: the local in-process backend (VECTOR_BACKEND=local) on a synthetic corpus
+- Redis: an in-memory stand-in for the handful of commands the chat path uses
+- Ollama: an httpx MockTransport with a configurable prefill delay and tokens/sec
+- embedding model: deterministic hash vectors with a configurable encode time per batch
+SQLite, vector and cache files go to a temporary directory.
+
+Reports p50/p95/p99 per pipeline stage (cache, embed, retrieve, prompt, generate) and
+end to end, plus throughput and status codes, and writes them as JSON.
+
+  python scripts/benchmark.py --requests 500 --concurrency 16 --cache-hit-ratio 0.3
+  python scripts/benchmark.py --set OLLAMA_MAX_INFLIGHT=4 --set TOP_K=3
+  python scripts/benchmark.py --out bench/today.json --compare bench/last_week.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# make script runnable directly from project root
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+STAGES = ("cache", "embed", "retrieve", "prompt", "generate")
+
+WORDS = ["connection", "timeout", "invoice", "password", "account", "server", "backup", "license",
+         "export", "report", "printer", "network", "update", "install", "error", "login"]
+JA_WORDS = ["接続", "請求書", "パスワード", "アカウント", "サーバー", "バックアップ", "ライセンス",
+            "エクスポート", "レポート", "プリンター", "ネットワーク", "更新", "インストール", "エラー"]
+
+
+# ---------------- stand-ins ----------------
+class FakeRedis:
+    """
+    In-memory subset of redis.asyncio.Redis: get/set (ex, px, nx)/delete/exists/zrangebyscore
+    and eval of the scripts on the chat path (lock release/extend, semantic cache publish).
+    """
+
+    def __init__(self):
+        self._data = {}
+
+    def _live(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def get(self, key):
+        return self._live(key)
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and self._live(key) is not None:
+            return None
+        ttl = ex if ex is not None else (px / 1000.0 if px is not None else None)
+        self._data[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+        return True
+
+    async def delete(self, *keys):
+        return sum(1 for k in keys if self._data.pop(k, None) is not None)
+
+    async def exists(self, *keys):
+        return sum(1 for k in keys if self._live(k) is not None)
+
+    async def eval(self, script, numkeys, *args):
+        from core.services import redis_service, semantic_cache
+        if script == semantic_cache._PUBLISH:
+            seq_key, key, member, max_entries, ttl = args
+            seq = int(self._live(seq_key) or 0) + 1
+            self._data[seq_key] = (seq, None)
+            zset = dict(self._live(key) or {})
+            zset[member] = seq
+            keep = sorted(zset.items(), key=lambda kv: kv[1])[-int(max_entries):]
+            self._data[key] = (dict(keep), time.monotonic() + int(ttl))
+            return seq
+        if script == redis_service._EXTEND_LOCK:
+            key, token, ttl_ms = args
+            if self._live(key) != token:
+                return 0
+            self._data[key] = (token, time.monotonic() + int(ttl_ms) / 1000.0)
+            return 1
+        # compare-and-delete lock release
+        key, token = args
+        if self._live(key) == token:
+            return await self.delete(key)
+        return 0
+
+    async def zrangebyscore(self, key, min, max, withscores=False):
+        low = float(min.lstrip("(")) if min != "-inf" else float("-inf")
+        high = float(max) if max != "+inf" else float("inf")
+        rows = sorted(((m, sc) for m, sc in (self._live(key) or {}).items()
+                       if (sc > low if min.startswith("(") else sc >= low) and sc <= high), key=lambda r: r[1])
+        return [(m, float(sc)) for m, sc in rows] if withscores else [m for m, _ in rows]
+
+
+def fake_vector(text: str, dim: int):
+    import numpy as np
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vec = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+class FakeEmbedModel:
+    """Stands in for SentenceTransformer.encode: hash vectors, encode_ms per batch."""
+
+    def __init__(self, dim: int, encode_ms: float):
+        self.dim = dim
+        self.encode_ms = encode_ms
+
+    def encode(self, texts, normalize_embeddings=True):
+        import numpy as np
+        time.sleep(self.encode_ms / 1000.0)
+        return np.stack([fake_vector(t, self.dim) for t in texts])
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+
+def fake_ollama_transport(prefill_ms: float, prefill_ms_per_1k_tokens: float, tokens_per_sec: float, answer_tokens: int):
+    import httpx
+
+    async def handler(request: httpx.Request):
+        body = json.loads(request.content)
+        prompt_tokens = len(body.get("prompt", "").split())
+        await asyncio.sleep((prefill_ms + prefill_ms_per_1k_tokens * prompt_tokens / 1000.0) / 1000.0)
+        tokens = ["tok"] * answer_tokens
+        if not body.get("stream"):
+            await asyncio.sleep(answer_tokens / tokens_per_sec)
+            return httpx.Response(200, json={"response": " ".join(tokens), "done": True,
+                                             "prompt_eval_count": prompt_tokens, "eval_count": answer_tokens})
+
+        async def stream():
+            for t in tokens:
+                await asyncio.sleep(1.0 / tokens_per_sec)
+                yield (json.dumps({"response": t + " ", "done": False}) + "\n").encode()
+            yield (json.dumps({"response": "", "done": True}) + "\n").encode()
+        return httpx.Response(200, content=stream())
+
+    return httpx.MockTransport(handler)
+
+
+# ---------------- measurement ----------------
+class StageTimer:
+    def __init__(self):
+        self.samples = {s: [] for s in STAGES}
+
+    def wrap_async(self, stage, fn):
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.samples[stage].append((time.perf_counter() - started) * 1000.0)
+        return timed
+
+    def wrap_sync(self, stage, fn):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.samples[stage].append((time.perf_counter() - started) * 1000.0)
+        return timed
+
+
+def summarize(samples):
+    import numpy as np
+    if not samples:
+        return {"count": 0}
+    arr = np.asarray(samples)
+    return {
+        "count": int(arr.size),
+        "mean_ms": round(float(arr.mean()), 3),
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "max_ms": round(float(arr.max()), 3),
+    }
+
+
+# ---------------- workload ----------------
+def make_question(rng: random.Random, lang: str, n: int) -> str:
+    words = rng.sample(JA_WORDS if lang == "ja" else WORDS, 3)
+    code = f"ERR-{rng.randint(1000, 9999)}"
+    return f"{' '.join(words)} {code} #{n}" if lang == "en" else f"{''.join(words)}の{code}について #{n}"
+
+
+def make_workload(args, rng: random.Random, modules):
+    """Request list; cache-hit requests repeat questions from a warm set answered before timing."""
+    langs = [l.strip() for l in args.langs.split(",") if l.strip()]
+    warm = [{"text": make_question(rng, l, i), "lang": l, "module": rng.choice(modules)}
+            for i, l in enumerate(rng.choices(langs, k=max(1, args.warm_questions)))]
+    requests = []
+    for n in range(args.requests):
+        if rng.random() < args.cache_hit_ratio:
+            requests.append(dict(rng.choice(warm)))
+        else:
+            lang = rng.choice(langs)
+            module = rng.choice(modules) if rng.random() < args.module_ratio else None
+            requests.append({"text": make_question(rng, lang, 100000 + n), "lang": lang, "module": module})
+    return warm, requests
+
+
+async def seed_corpus(args, rng: random.Random, modules):
+    from core.services import vector_store, lexical_index
+    from config.settings import settings
+    points = []
+    for m in modules:
+        for i in range(args.chunks_per_module):
+            lang = "ja" if i % 2 else "en"
+            text = " ".join(rng.choices(JA_WORDS if lang == "ja" else WORDS, k=120)) + f" ERR-{rng.randint(1000, 9999)}"
+            points.append({"id": f"{m}-{i}", "vector": fake_vector(text, args.dim).tolist(),
+                           "payload": {"module": m, "filename": f"{m}.txt", "lang": lang, "chunk_index": i, "text": text}})
+    for i in range(0, len(points), 512):
+        batch = points[i:i + 512]
+        await vector_store.aupsert(settings.QDRANT_COLLECTION, batch)
+        await lexical_index.index_points(batch)
+    return len(points)
+
+
+async def drive(args):
+    import httpx
+    import app as app_module
+    from api.routers import chat
+
+    rng = random.Random(args.seed)
+    modules = [f"module{i}" for i in range(args.modules)]
+    warm, workload = make_workload(args, rng, modules)
+
+    timer = StageTimer()
+    chat.get_cached_answer = timer.wrap_async("cache", chat.get_cached_answer)
+    chat.embed_text = timer.wrap_async("embed", chat.embed_text)
+    chat.run_retrieval = timer.wrap_async("retrieve", chat.run_retrieval)
+    chat.assemble_prompt = timer.wrap_sync("prompt", chat.assemble_prompt)
+    chat.generate = timer.wrap_async("generate", chat.generate)
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with app_module.app.router.lifespan_context(app_module.app):
+        # after startup, which creates the lexical index tables
+        corpus = await seed_corpus(args, rng, modules)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            # warm-up: answer the repeated questions once so they hit the cache later
+            for q in warm:
+                await client.post("/api/chat/query", json=q)
+            for samples in timer.samples.values():
+                samples.clear()
+
+            latencies, statuses, cached = [], {}, 0
+            queue = asyncio.Queue()
+            for q in workload:
+                queue.put_nowait(q)
+
+            async def worker():
+                nonlocal cached
+                while not queue.empty():
+                    q = queue.get_nowait()
+                    started = time.perf_counter()
+                    r = await client.post("/api/chat/query", json=q)
+                    latencies.append((time.perf_counter() - started) * 1000.0)
+                    statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+                    if r.status_code == 200 and r.json().get("cached"):
+                        cached += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+            elapsed = time.perf_counter() - started
+
+    return {
+        "corpus_points": corpus,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(workload) / elapsed, 2) if elapsed else None,
+        "status_codes": {str(k): v for k, v in sorted(statuses.items())},
+        "cached_responses": cached,
+        "latency": {"end_to_end": summarize(latencies), **{s: summarize(v) for s, v in timer.samples.items()}},
+    }
+
+
+def setup_environment(args, workdir: Path):
+    # must run before the app (and config.settings) is imported
+    os.environ.update({
+        "VECTOR_BACKEND": "local",
+        "LOCAL_VECTOR_DIR": str(workdir / "vectors"),
+        "EMBED_CACHE_DIR": str(workdir / "embed_cache"),
+        "RERANK_ENABLED": "false",
+        "HYBRID_ENABLED": "true" if args.hybrid else "false",
+        "SEMANTIC_CACHE_ENABLED": "true" if args.semantic_cache else "false",
+    })
+    for item in args.set:
+        key, _, value = item.partition("=")
+        os.environ[key.strip()] = value
+    from db import engine
+    engine.DB_PATH = workdir / "app.db"
+
+    from core.services import redis_service, embedder, ollama_service
+    fake = FakeRedis()
+    redis_service.redis_client = fake
+    import auth.sessions
+    auth.sessions.redis_client = fake
+    embedder._st_model = FakeEmbedModel(args.dim, args.embed_ms)
+    import httpx
+    ollama_service.client = httpx.AsyncClient(transport=fake_ollama_transport(
+        args.prefill_ms, args.prefill_ms_per_1k, args.tokens_per_sec, args.answer_tokens))
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def print_report(result, previous=None):
+    print(f"\nthroughput: {result['results']['throughput_rps']} req/s   status: {result['results']['status_codes']}")
+    print(f"{'stage':<12}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}" + ("   p95 vs previous" if previous else ""))
+    for stage, s in result["results"]["latency"].items():
+        if not s.get("count"):
+            continue
+        line = f"{stage:<12}{s['count']:>7}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}"
+        old = (previous or {}).get("results", {}).get("latency", {}).get(stage, {})
+        if old.get("p95_ms"):
+            line += f"   {(s['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100:+.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load/latency benchmark of /api/chat/query.")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--cache-hit-ratio", type=float, default=0.3, help="share of requests repeating a warm question")
+    parser.add_argument("--warm-questions", type=int, default=20)
+    parser.add_argument("--langs", default="ja,en")
+    parser.add_argument("--modules", type=int, default=5)
+    parser.add_argument("--module-ratio", type=float, default=0.8, help="share of new questions with a module filter")
+    parser.add_argument("--chunks-per-module", type=int, default=400)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--embed-ms", type=float, default=8.0, help="fake encode time per batch")
+    parser.add_argument("--prefill-ms", type=float, default=50.0, help="fake Ollama fixed prefill delay")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=200.0, help="extra prefill delay per 1000 prompt words")
+    parser.add_argument("--tokens-per-sec", type=float, default=400.0)
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--no-hybrid", dest="hybrid", action="store_false")
+    parser.add_argument("--no-semantic-cache", dest="semantic_cache", action="store_false")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="override a setting, e.g. --set OLLAMA_MAX_INFLIGHT=4 (repeatable)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", type=Path, default=None, help="results JSON (default: bench_results/<timestamp>.json)")
+    parser.add_argument("--compare", type=Path, default=None, help="earlier results JSON to compare p95 against")
+    args = parser.parse_args()
+
+    # the app serves ./public relative to the working directory
+    os.chdir(ROOT)
+    with tempfile.TemporaryDirectory(prefix="ragbench-") as tmp:
+        setup_environment(args, Path(tmp))
+        from db.engine import close_pool
+        from core.services import vector_store
+
+        async def run():
+            try:
+                return await drive(args)
+            finally:
+                await vector_store.aclose()
+                await close_pool()
+        results = asyncio.run(run())
+
+    result = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": git_revision(),
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": results,
+    }
+    out = args.out or ROOT / "bench_results" / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+    previous = json.loads(args.compare.read_text(encoding="utf-8")) if args.compare else None
+    print_report(result, previous)
+    print(f"\nresults written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,36 @@
 # scripts/init_db.py
+"""
+Initialize the app database and, optionally, the Qdrant collection.
+
+  python scripts/init_db.py                          # SQLite tables + default admin
+  python scripts/init_db.py --collection             # ... and create/migrate the Qdrant collection
+  python scripts/init_db.py --collection --skip-db   # collection only
+  python scripts/init_db.py --collection --recreate  # drop and recreate it (re-ingest afterwards!)
+"""
+import argparse
 import asyncio
+import sys
+import uuid
+from pathlib import Path
+
+# make script runnable directly from project root
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
 from db.users import init_users_table, create_user
 from db.modules import init_modules_table
 from db.logs import init_logs_table
-import uuid
+from db.jobs import init_jobs_table
+from db.lexical import init_lexical_tables
+from db.engine import close_pool
 
-async def main():
+async def init_db():
     await init_users_table()
     await init_modules_table()
     await init_logs_table()
+    await init_jobs_table()
+    await init_lexical_tables()
     # create a default admin (change password)
     try:
         user_id = str(uuid.uuid4())
@@ -16,6 +38,29 @@ async def main():
         print("Created default admin: username=admin password=adminpass")
     except Exception as e:
         print("failed to create default admin:", e)
+    # pooled connections run in non-daemon threads; close them so the script can exit
+    await close_pool()
+
+def init_collection(dim: int = None, recreate: bool = False):
+    from core.services.qdrant_service import qc
+    from core.services.qdrant_collection import ensure_collection, ensure_payload_indexes
+    result = ensure_collection(qc, dim=dim, recreate=recreate)
+    print(f"Collection {result['collection']}: {result['action']}" + (f" ({', '.join(result['changed'])})" if result["changed"] else ""))
+    indexes = ensure_payload_indexes(qc)
+    print("Payload indexes:", "ok" if indexes["ok"] else "NOT healthy", indexes.get("fields") or indexes.get("error"))
+
+def main():
+    parser = argparse.ArgumentParser(description="Initialize the database and the Qdrant collection.")
+    parser.add_argument("--collection", action="store_true", help="create or migrate the Qdrant collection from settings")
+    parser.add_argument("--recreate", action="store_true", help="with --collection: drop and recreate the collection (deletes all points)")
+    parser.add_argument("--dim", type=int, default=None, help="vector size (default: EMBED_DIM or the loaded embedding model)")
+    parser.add_argument("--skip-db", action="store_true", help="do not touch the SQLite database")
+    args = parser.parse_args()
+
+    if not args.skip_db:
+        asyncio.run(init_db())
+    if args.collection:
+        init_collection(dim=args.dim, recreate=args.recreate)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()